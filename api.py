@@ -1,20 +1,59 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Header, Depends, Response
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from main import process_file, answer_question_based_on_notes, get_all_sources, delete_source, summarize_file, generate_flash_cards
-import os, shutil
-from typing import List, Literal
+from main import process_file, process_files, file_fingerprint, find_unchanged, aanswer_question_based_on_notes, astream_answer, create_chat_session, get_chat_session, delete_chat_session, get_documents, count_sources, delete_source, summarize_file, generate_flash_cards, get_cache_stats, get_metrics_text, warm_up, get_readiness
+import os, shutil, tempfile, json, logging, threading, zipfile
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+from jobs import JobQueue, QueueFull
+from parsing import SUPPORTED_EXTENSIONS, extract_archive
+from chunking import ChunkingOptions
+from db import check_notebook
+from config import DEFAULT_NOTEBOOK, INGEST_WORKERS, INGEST_MAX_PENDING, BULK_UPLOAD_MAX_FILES, BULK_UPLOAD_MAX_BYTES, WARMUP_ON_STARTUP, LOG_LEVEL, LOG_CONTENT
 
 ## This file handles our API Routes ##
 
+# key=value messages on one line each, so log aggregators can parse them
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s level=%(levelname)s logger=%(name)s %(message)s")
+logger = logging.getLogger(__name__)
+
+UPLOAD_COPY_BUFFER_SIZE = 1024 * 1024   # bytes copied from the upload to disk at a time
+
+# Warm up in the background so the worker answers /healthz right away, /readyz turns 200 once it's done
+def _warm_up():
+    try:
+        warm_up()
+    except Exception as e:
+        logger.exception("warm-up failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    yield
+
 app = FastAPI(
     title="Clarity API",
     description="Upload docs, ask questions, generate summaries and flashcards.",
-    version='1.0.0'
+    version='1.0.0',
+    lifespan=lifespan
 )
+
+# Uploads are ingested in the background by a fixed number of workers
+job_queue = JobQueue(max_workers=INGEST_WORKERS, max_pending=INGEST_MAX_PENDING)
     
 ## Define Models ##
+class DocumentInfo(BaseModel): # Catalog entry for an uploaded document
+    source: str
+    chunk_count: int
+    byte_size: Optional[int] = None
+    page_count: Optional[int] = None
+    uploaded_at: float
+
 class ListResponse(BaseModel): # List of all document names
     file_names : List[str]
+    documents : List[DocumentInfo] = []
+    total : int = 0  # number of documents across all pages
     
 class ChatTurn(BaseModel): # Single Chat Message (Turn)
     role: Literal['user','assistant'] # Who is  speaking (user or AI)
@@ -22,7 +61,14 @@ class ChatTurn(BaseModel): # Single Chat Message (Turn)
 
 class QueryRequest (BaseModel): # Query Sent to API
     query: str  # current question being asked
-    chat_history: List[ChatTurn]    # List of previous messages to preserve context 
+    chat_history: List[ChatTurn] = []    # List of previous messages to preserve context (ignored when session_id is set)
+    session_id: Optional[str] = None    # server-side session holding the history (see /sessions)
+    sources: Optional[List[str]] = None    # only search these files (all files when not set)
+
+class SessionResponse(BaseModel): # Server-side chat session
+    session_id: str
+    summary: str = ''   # running summary of turns that no longer fit the history budget
+    turns: List[ChatTurn] = []    # most recent turns
 
 class QueryResponse(BaseModel): # Structure of LLM response 
     answer: str # LLM response
@@ -41,23 +87,100 @@ class QAPair(BaseModel):
 # takes in the document name and returns list of QA pairs in JSON format 
 class FlashCards(BaseModel):
     flash_cards: List[QAPair]
+
+# Outcome of one file of a bulk upload
+class FileResult(BaseModel):
+    file_name: str
+    status: Literal['queued','succeeded','failed','cancelled']
+    chunks: int = 0
+    pages: Optional[int] = None
+    error: Optional[str] = None
+    unchanged: bool = False  # identical to the file the document was last ingested from, not ingested again
+
+# Status and progress of a background ingestion job
+class JobStatus(BaseModel):
+    job_id: str
+    file_name: str
+    notebook: Optional[str] = None
+    status: Literal['queued','running','succeeded','failed','cancelled']
+    stage: str  # what the job is doing right now (parsing, embedding, ...)
+    pages_total: Optional[int] = None  # only known for pdfs
+    pages_parsed: int
+    chunks_split: int
+    chunks_embedded: int
+    files_total: Optional[int] = None  # only set for bulk uploads
+    files_done: int = 0
+    results: List[FileResult] = []  # per file outcome of a bulk upload
+    error: Optional[str] = None
+    unchanged: bool = False  # the document was already ingested from identical bytes, nothing was done
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
     
 ## Routes ##
 
-@app.post("/upload") # Upload File 
+# Notebook a request works in, from the X-Notebook header (per user or per course).
+# Uploads, listing, deletion, retrieval, summaries and jobs only see that notebook's documents
+def get_notebook(x_notebook: Optional[str] = Header(None, description="Notebook to work in (default notebook when not set)")) -> str:
+    try:
+        return check_notebook(x_notebook or DEFAULT_NOTEBOOK)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/healthz", tags=["Health"])
+def healthz():
+    """ Liveness probe: the worker is up and serving requests """
+    return {"status": "ok"}
+
+@app.get("/readyz", tags=["Health"])
+def readyz():
+    """ Readiness probe: 200 once warm-up has finished, 503 (with the warm-up error if any) before that.
+    Load balancers should only route traffic to ready workers
+    """
+    readiness = get_readiness(WARMUP_ON_STARTUP)
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+# Chunking settings of one upload (query parameters), the ones not given come from the config
+def _chunking_options(chunker: Optional[str], chunk_tokens: Optional[int], chunk_overlap: Optional[int]) -> ChunkingOptions:
+    options = ChunkingOptions()
+    if chunker is not None:
+        options.chunker = chunker
+    if chunk_tokens is not None:
+        options.chunk_tokens = chunk_tokens
+    if chunk_overlap is not None:
+        options.overlap_tokens = chunk_overlap
+    try:
+        return options.validate()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/upload", response_model=JobStatus, status_code=202, tags=["Upload"]) # Upload File 
 # Expect a required file upload from a form, and when it comes in, treat it as a FastAPI UploadFile obj
-def upload_file(file: UploadFile = File(...)):
-    """ Allows users to upload files
+def upload_file(
+    response: Response,
+    file: UploadFile = File(...),
+    notebook: str = Depends(get_notebook),
+    chunker: Optional[Literal["structure", "recursive"]] = Query(None, description="Chunking strategy (default from the config)"),
+    chunk_tokens: Optional[int] = Query(None, description="Chunk size in tokens"),
+    chunk_overlap: Optional[int] = Query(None, description="Tokens shared by consecutive chunks"),
+):
+    """ Allows users to upload files. The file is saved and queued for ingestion,
+    poll /jobs/{job_id} to follow its progress.
+    Uploads are idempotent: if the document was last ingested from identical bytes (with the same chunking
+    settings) a finished job marked `unchanged` is returned right away (200), and while the same upload is
+    still queued or running its job is returned instead of a new one.
 
     Args:
         file (UploadFile, optional): File object.
+        chunker, chunk_tokens, chunk_overlap (optional): How this file is chunked
 
     Raises:
-        HTTPException 400: File type unsupported
+        HTTPException 400: File type unsupported or invalid chunking settings
         HTTPException 500: File upload failed
+        HTTPException 503: Too many uploads are waiting to be processed
 
     Returns:
-        Success Message
+        JobStatus: The queued (or existing) ingestion job
     """
     # Files we are capable of processing
     allowed_extensions = ['.txt','.pdf']
@@ -66,75 +189,311 @@ def upload_file(file: UploadFile = File(...)):
     
     if not file_extension in allowed_extensions:
         raise HTTPException(status_code=400, detail=f"Unsuported file type. Supported file types: {', '.join(allowed_extensions)}")
+    chunking = _chunking_options(chunker, chunk_tokens, chunk_overlap)
     
-    temp_file_path = f"temp_{file.filename}"
+    # Unique temp file in the system temp dir so concurrent uploads of the same name can't collide
+    with tempfile.NamedTemporaryFile(suffix=file_extension, delete=False) as buffer:
+        temp_file_path = buffer.name
+    
+    # the worker removes the temp file once the job is over
+    def remove_temp_file():
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
     
     try:
-        # Save the uploaded file to temporary buffer 
+        # Stream the uploaded file to disk in fixed size pieces
         with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file,buffer) # create a temp file and copy contents into it 
+            shutil.copyfileobj(file.file,buffer,UPLOAD_COPY_BUFFER_SIZE) # copy contents into the temp file
             
-        # file_content
-        success = process_file(temp_file_path,file_name) # Call function to embed and store document
-        
-        if success:
-            return {"message":f"File {file.filename} has been successfully uploaded"}
-        else:
-            raise HTTPException(status_code=500, detail=f"Failed to upload {file.filename}.")
+        # Nothing to do when the document was already ingested from these bytes
+        fingerprint = file_fingerprint(temp_file_path, chunking)
+        if find_unchanged(file_name, fingerprint, notebook):
+            remove_temp_file()
+            response.status_code = 200
+            return JobStatus(**job_queue.completed(file_name, notebook=notebook, unchanged=True).to_dict())
+            
+        # Queue the embed and store step, the request returns right away
+        job = job_queue.submit(
+            file_name,
+            lambda job: process_file(temp_file_path,file_name,job,chunking,notebook,fingerprint),
+            cleanup=remove_temp_file,
+            notebook=notebook,
+            key=f"{notebook}/{file_name}/{fingerprint}"
+        )
+        return JobStatus(**job.to_dict())
+    
+    except QueueFull as e:
+        remove_temp_file()
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        remove_temp_file()
+        raise HTTPException(status_code=500, detail=f"Failed to upload {file.filename}: {e}")
+
+@app.post("/upload/bulk", response_model=JobStatus, status_code=202, tags=["Upload"])
+def upload_files(
+    files: List[UploadFile] = File(...),
+    notebook: str = Depends(get_notebook),
+    chunker: Optional[Literal["structure", "recursive"]] = Query(None, description="Chunking strategy (default from the config)"),
+    chunk_tokens: Optional[int] = Query(None, description="Chunk size in tokens"),
+    chunk_overlap: Optional[int] = Query(None, description="Tokens shared by consecutive chunks"),
+):
+    """ Upload many files at once: any mix of .txt / .pdf files and .zip archives of them.
+    They are ingested by one background job (parsed in parallel worker processes while earlier files
+    are embedded), poll /jobs/{job_id} for progress and the per file results.
+
+    Args:
+        files (List[UploadFile]): Files and / or zip archives
+        chunker, chunk_tokens, chunk_overlap (optional): How the files are chunked
+
+    Raises:
+        HTTPException 400: Nothing to ingest, a bad archive, invalid chunking settings, or more than the allowed files / bytes
+        HTTPException 503: Too many uploads are waiting to be processed
+
+    Returns:
+        JobStatus: The queued ingestion job
+    """
+    chunking = _chunking_options(chunker, chunk_tokens, chunk_overlap)
+    temp_dir = tempfile.mkdtemp(prefix="clarity-bulk-")
+    def remove_temp_dir():
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    try:
+        to_ingest = []   # (path, uploaded name), files named like an earlier one get a failed result
+        for upload in files:
+            extension = os.path.splitext(upload.filename)[1].lower()
+            if extension not in SUPPORTED_EXTENSIONS + ('.zip',):
+                raise HTTPException(status_code=400, detail=f"Unsuported file type: {upload.filename}. Supported file types: {', '.join(SUPPORTED_EXTENSIONS + ('.zip',))}")
+            handle, path = tempfile.mkstemp(suffix=extension, dir=temp_dir)
+            with os.fdopen(handle, "wb") as buffer:
+                shutil.copyfileobj(upload.file, buffer, UPLOAD_COPY_BUFFER_SIZE)
+            if extension == '.zip':
+                try:
+                    members = extract_archive(path, temp_dir, BULK_UPLOAD_MAX_FILES, BULK_UPLOAD_MAX_BYTES)
+                except zipfile.BadZipFile:
+                    raise HTTPException(status_code=400, detail=f"{upload.filename} is not a valid zip archive")
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=f"{upload.filename}: {e}")
+                os.remove(path)
+                to_ingest.extend(members)
+            else:
+                to_ingest.append((path, upload.filename))
+        if not to_ingest:
+            raise HTTPException(status_code=400, detail="No .txt or .pdf files to ingest")
+        if len(to_ingest) > BULK_UPLOAD_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"{len(to_ingest)} files uploaded, at most {BULK_UPLOAD_MAX_FILES} are allowed")
         
-    finally: 
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        def work(job):
+            results = process_files(to_ingest, job, chunking, notebook)
+            failed = sum(1 for result in results if result["status"] != "succeeded")
+            if failed:
+                job.error = f"{failed} of {len(results)} files failed"
+            return not failed
+        job = job_queue.submit(f"{len(to_ingest)} files", work, cleanup=remove_temp_dir, notebook=notebook)
+        return JobStatus(**job.to_dict())
+    
+    except HTTPException:
+        remove_temp_dir()
+        raise
+    except QueueFull as e:
+        remove_temp_dir()
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        remove_temp_dir()
+        raise HTTPException(status_code=500, detail=f"Failed to upload files: {e}")
+
+@app.get("/jobs", response_model=List[JobStatus], tags=["Upload"])
+def list_jobs(notebook: str = Depends(get_notebook)):
+    """
+    Lists the notebook's recent ingestion jobs, newest first
+
+    Returns:
+        List[JobStatus]: Status of each job
+    """
+    return [JobStatus(**job.to_dict()) for job in job_queue.list(notebook)]
+
+# A job of the request's notebook, jobs of other notebooks are reported as unknown
+def _notebook_job(job_id: str, notebook: str):
+    job = job_queue.get(job_id)
+    if job is None or job.notebook != notebook:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.get("/jobs/{job_id}", response_model=JobStatus, tags=["Upload"])
+def get_job(job_id: str, notebook: str = Depends(get_notebook)):
+    """
+    Reports the status and per-stage progress of an ingestion job
+
+    Args:
+        job_id (str): Id returned by /upload
+
+    Raises:
+        HTTPException 404: Unknown job id
+
+    Returns:
+        JobStatus: Current state of the job
+    """
+    return JobStatus(**_notebook_job(job_id, notebook).to_dict())
+
+@app.post("/jobs/{job_id}/cancel", response_model=JobStatus, tags=["Upload"])
+def cancel_job(job_id: str, notebook: str = Depends(get_notebook)):
+    """
+    Cancels an ingestion job. Queued jobs never start, running jobs stop before
+    their next batch: the chunks stored so far are removed and the previous version of the document stays.
+
+    Args:
+        job_id (str): Id returned by /upload
+
+    Raises:
+        HTTPException 404: Unknown job id
+
+    Returns:
+        JobStatus: State of the job after the cancel request
+    """
+    job = job_queue.cancel(_notebook_job(job_id, notebook).id)
+    return JobStatus(**job.to_dict())
 
 
 @app.post("/chat", response_model=QueryResponse, tags=["Chat"])
 # parse JSON body and validate against QueryRequest model and return python obj
-async def query_llm(payload: QueryRequest): 
+async def query_llm(payload: QueryRequest, notebook: str = Depends(get_notebook)): 
     """
     Context based conversation w/ the LLM based on uploaded docuements
 
     Args:
-        payload (QueryRequest): User's query (str) and chat history (List[str])
+        payload (QueryRequest): User's query (str) and chat history (List[str]) or session id
 
     Raises:
+        HTTPException 404: if the session id is unknown
         HTTPException 500: if LLM coud not produce a response
 
     Returns:
         QueryResponse: The LLM's reply to query based on chat context
     """
     try:
-        print("Chat History: ", payload.chat_history)
-        result = answer_question_based_on_notes(
+        if LOG_CONTENT:
+            logger.debug("chat history=%r", payload.chat_history)
+        result = await aanswer_question_based_on_notes(
             query = payload.query, # pass query to LLM
-            chat_history = [{"role": turn.role, "content": turn.content} for turn in payload.chat_history]
+            chat_history = [{"role": turn.role, "content": turn.content} for turn in payload.chat_history],
+            session_id = payload.session_id,
+            sources = payload.sources,
+            notebook = notebook
         ) 
         return QueryResponse(answer=result["answer"])
     
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream", tags=["Chat"])
+async def stream_llm(payload: QueryRequest, notebook: str = Depends(get_notebook)):
+    """
+    Same as /chat, but streams the reply as Server-Sent Events while the LLM generates it.
+    Each event is `data: {"token": "..."}`, the stream ends with an `event: done` event
+    (or an `event: error` event carrying `{"detail": "..."}`)
+
+    Args:
+        payload (QueryRequest): User's query (str) and chat history (List[str]) or session id
+
+    Raises:
+        HTTPException 404: if the session id is unknown
+
+    Returns:
+        StreamingResponse: text/event-stream of answer tokens
+    """
+    chat_history = [{"role": turn.role, "content": turn.content} for turn in payload.chat_history]
+    # check the session before the stream starts so an unknown id is a plain 404
+    if payload.session_id is not None:
+        try:
+            get_chat_session(payload.session_id)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    
+    async def events():
+        try:
+            async for token in astream_answer(payload.query, chat_history, payload.session_id, payload.sources, notebook):
+                yield f"data: {json.dumps({'token': token})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    
+    # no-cache / no buffering so proxies forward every token as soon as it is sent
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/sessions", response_model=SessionResponse, tags=["Chat"])
+def create_session():
+    """
+    Starts a server-side chat session. Send its id with /chat or /chat/stream
+    instead of the whole chat history.
+
+    Returns:
+        SessionResponse: The new (empty) session
+    """
+    return SessionResponse(session_id=create_chat_session())
+
+@app.get("/sessions/{session_id}", response_model=SessionResponse, tags=["Chat"])
+def get_session(session_id: str):
+    """
+    Returns the history the server keeps for a chat session
+
+    Args:
+        session_id (str): Id returned by POST /sessions
+
+    Raises:
+        HTTPException 404: Unknown session id
+
+    Returns:
+        SessionResponse: Running summary and most recent turns
+    """
+    try:
+        session = get_chat_session(session_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return SessionResponse(session_id=session_id, **session)
+
+@app.delete("/sessions/{session_id}", response_model=DeleteResponse, tags=["Chat"])
+def end_session(session_id: str):
+    """
+    Deletes a chat session and its history
+
+    Args:
+        session_id (str): Id returned by POST /sessions
+
+    Returns:
+        DeleteResponse: Whether the session existed
+    """
+    return DeleteResponse(success=delete_chat_session(session_id))
+
 @app.get("/documents", response_model = ListResponse, tags=["List all Docs"])
-def get_files():
+def get_files(offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), notebook: str = Depends(get_notebook)):
     """
-    Retrieves all unique documents present in the vector database
+    Retrieves the notebook's uploaded documents from its document catalog, one page at a time
     
-    Args: None
+    Args:
+        offset (int): Number of documents to skip
+        limit (int): Maximum number of documents to return
     
     Raises:
         HTTPException 500: if could not retrieve documents
         
     Returns:
-        - ListResponse: a list of all document names
+        - ListResponse: document names and details for the page, and the total number of documents
     """
     try:
-        result = get_all_sources()
-        return ListResponse(file_names=result)
+        documents = get_documents(offset, limit, notebook)
+        return ListResponse(
+            file_names=[document["source"] for document in documents],
+            documents=[DocumentInfo(**document) for document in documents],
+            total=count_sources(notebook),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     
 @app.post("/delete", response_model= DeleteResponse, tags=["Delete"])
-def delete_file(doc: FileRequest):
+def delete_file(doc: FileRequest, notebook: str = Depends(get_notebook)):
     """
     Deletes all document chunks related to a specific file.
 
@@ -145,7 +504,7 @@ def delete_file(doc: FileRequest):
         DeleteResponse: Boolean flag indicating whether deletion was successful.
     """
     try:
-        result = delete_source(doc.file_name)
+        result = delete_source(doc.file_name, notebook)
         return DeleteResponse(success=result)
     
     except Exception as e:
@@ -153,7 +512,7 @@ def delete_file(doc: FileRequest):
         
 
 @app.post("/summarize", response_model=QueryResponse, tags=["Summarize"])
-def summarize(doc: FileRequest):
+def summarize(doc: FileRequest, notebook: str = Depends(get_notebook)):
     """
     Generate indepth summaries of documents
 
@@ -167,13 +526,13 @@ def summarize(doc: FileRequest):
         QueryResponse: The LLM's response containing the summary
     """
     try:
-        response = summarize_file(doc.file_name)
+        response = summarize_file(doc.file_name, notebook)
         return QueryResponse(answer=response["answer"])
     except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
         
 @app.post(path = "/flashcards", response_model=FlashCards, tags=["Flashcards"])
-def create_flashcards(doc: FileRequest):
+def create_flashcards(doc: FileRequest, notebook: str = Depends(get_notebook)):
     """
     Generate "flashcards"(question and answer pairs) based on documents
 
@@ -187,8 +546,38 @@ def create_flashcards(doc: FileRequest):
         Flashcards: Q&A pairs
     """
     try:
-        response = generate_flash_cards(doc.file_name)
+        response = generate_flash_cards(doc.file_name, notebook)
         return FlashCards(flash_cards = response.get("flash_cards",[]))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
\ No newline at end of file
+
+@app.get("/cache/stats", tags=["Cache"])
+def cache_stats():
+    """
+    Reports the size and hit / miss counts of the backend caches
+
+    Raises:
+        HTTPException 500: If the cache could not be read
+
+    Returns:
+        dict: Stats for each cache
+    """
+    try:
+        return get_cache_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Health"])
+def metrics():
+    """
+    Prometheus metrics: latency histograms per stage (load, split, embed, upsert, retrieve, llm, cache_lookup),
+    LLM call and token counters, cache counters and ingestion jobs by status
+
+    Returns:
+        PlainTextResponse: Metrics in the Prometheus text format
+    """
+    jobs = {}
+    for job in job_queue.list():
+        jobs[(job.status,)] = jobs.get((job.status,), 0) + 1
+    text = get_metrics_text({"clarity_jobs": ("Ingestion jobs by status (recent finished jobs included)", ("status",), jobs)})
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
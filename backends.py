@@ -0,0 +1,133 @@
+import re, json, time, zlib, asyncio, hashlib
+from typing import Any, Callable
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatResult, ChatGeneration, ChatGenerationChunk
+from config import (EMBEDDING_BACKEND, EMBEDDING_MODEL, EMBEDDING_BASE_URL, EMBEDDING_BATCH_SIZE, LOCAL_EMBEDDING_DIM,
+                    CHAT_BACKEND, CHAT_MODEL, STUB_CHAT_LATENCY, STUB_CHAT_TOKEN_DELAY)
+
+## This File holds the embedding / chat model backends, picked by name from the config ##
+# "openai" talks to the API, "local" / "stub" run offline (no key, no network) so the pipeline
+# can be tested, benchmarked and load tested, and bulk re-indexing can run without per call latency
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Feature hashing embedder: word unigrams and bigrams are hashed into `dim` signed buckets
+# Deterministic across processes (crc32, not Python's salted hash), texts sharing words end up close
+class HashingEmbeddings(Embeddings):
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.model = f"hashing-{dim}"   # used in the embedding cache key
+
+    def _embed(self, text: str) -> np.ndarray:
+        words = TOKEN_PATTERN.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+        hashes = np.fromiter((zlib.crc32(feature.encode()) for feature in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, (hashes % self.dim).astype(np.int64), signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text).tolist()
+
+# Deterministic chat model: the reply is derived from the prompt (flashcard JSON when a response_format is asked for)
+# `latency` is slept once per call, `token_delay` between streamed tokens
+class StubChatModel(BaseChatModel):
+    model_name: str = "stub"
+    latency: float = 0.0
+    token_delay: float = 0.0
+    reply_words: int = 60
+    card_count: int = 5
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _reply(self, messages, response_format: Any = None) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        if response_format is not None:
+            sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", prompt) if len(s.split()) > 3]
+            cards = [{"question": f"What does this say: {' '.join(s.split()[:8])}? ({digest}-{i})", "answer": s}
+                     for i, s in enumerate(sentences[:self.card_count])]
+            return json.dumps({"flash_cards": cards or [{"question": f"What is {digest}?", "answer": "A stub card."}]})
+        words = str(messages[-1].content).split()[:self.reply_words]
+        return f"[stub {digest}] " + " ".join(words)
+
+    def _tokens(self, text: str) -> list[str]:
+        return re.findall(r"\S+\s*", text)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        text = self._reply(messages, kwargs.get("response_format"))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        text = self._reply(messages, kwargs.get("response_format"))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for token in self._tokens(self._reply(messages, kwargs.get("response_format"))):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(self._reply(messages, kwargs.get("response_format"))):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+def _openai_embeddings() -> Embeddings:
+    from langchain_openai import OpenAIEmbeddings
+    # EmbeddingClient retries on rate limits, so the SDK's own retries are off
+    return OpenAIEmbeddings(model=EMBEDDING_MODEL, base_url=EMBEDDING_BASE_URL, chunk_size=EMBEDDING_BATCH_SIZE, max_retries=0)
+
+def _local_embeddings() -> Embeddings:
+    return HashingEmbeddings(dim=LOCAL_EMBEDDING_DIM)
+
+def _openai_chat() -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+    # stream_usage so streamed replies report their token counts too
+    return ChatOpenAI(model=CHAT_MODEL, stream_usage=True)
+
+def _stub_chat() -> BaseChatModel:
+    return StubChatModel(latency=STUB_CHAT_LATENCY, token_delay=STUB_CHAT_TOKEN_DELAY)
+
+# name -> factory
+EMBEDDING_BACKENDS: dict[str, Callable[[], Embeddings]] = {"openai": _openai_embeddings, "local": _local_embeddings}
+CHAT_BACKENDS: dict[str, Callable[[], BaseChatModel]] = {"openai": _openai_chat, "stub": _stub_chat}
+
+def register_embedding_backend(name: str, factory: Callable[[], Embeddings]):
+    EMBEDDING_BACKENDS[name] = factory
+
+def register_chat_backend(name: str, factory: Callable[[], BaseChatModel]):
+    CHAT_BACKENDS[name] = factory
+
+def create_embeddings(name: str = None) -> Embeddings:
+    name = name or EMBEDDING_BACKEND
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}' (expected one of {', '.join(EMBEDDING_BACKENDS)})")
+    return EMBEDDING_BACKENDS[name]()
+
+def create_chat_model(name: str = None) -> BaseChatModel:
+    name = name or CHAT_BACKEND
+    if name not in CHAT_BACKENDS:
+        raise ValueError(f"Unknown chat backend '{name}' (expected one of {', '.join(CHAT_BACKENDS)})")
+    return CHAT_BACKENDS[name]()
+
+# Name used in cache keys and for token counting, so results of different models never mix
+def model_name_of(backend) -> str:
+    return getattr(backend, "model_name", None) or getattr(backend, "model", None) or type(backend).__name__
@@ -0,0 +1,309 @@
+import os, sys, json, time, random, shutil, argparse, platform, subprocess, tempfile, statistics
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+## This File benchmarks the backend stages on synthetic corpora with the offline backends ##
+# Every corpus size runs in a fresh process with its own data directory, so runs don't share caches.
+# Usage: python benchmark.py --sizes 1000,10000,100000,1000000 --output benchmark_results.json
+
+PARAGRAPH_CHARS = 900     # under the 1000 character chunk size, so every paragraph becomes one chunk
+SECTION_PARAGRAPHS = 20   # paragraphs under each heading in the chunking benchmark
+
+def _percentiles(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+# Seeded pseudo words with a Zipf-like frequency, so BM25 and the hashing embedder see realistic term statistics
+def _vocabulary(seed: int, size: int = 5000) -> tuple[list[str], list[float]]:
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+    weights = [1.0 / rank for rank in range(1, size + 1)]
+    return words, weights
+
+def _write_document(path: str, paragraphs: int, rng: random.Random, words, weights):
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(paragraphs):
+            paragraph = []
+            length = 0
+            for word in rng.choices(words, weights, k=PARAGRAPH_CHARS // 2):
+                if length + len(word) >= PARAGRAPH_CHARS:
+                    break
+                paragraph.append(word)
+                length += len(word) + 1
+            f.write(" ".join(paragraph) + ".\n\n")
+
+# Use the offline backends and a private data directory (must run before any project module is imported)
+def _configure(data_dir: str, options: dict):
+    os.environ.update({
+        "CLARITY_DATA_DIR": data_dir,
+        "CLARITY_EMBEDDING_BACKEND": "local",
+        "CLARITY_LOCAL_EMBEDDING_DIM": str(options["embedding_dim"]),
+        "CLARITY_CHAT_BACKEND": "stub",
+        "CLARITY_STUB_CHAT_LATENCY": str(options["llm_latency"]),
+        "CLARITY_SEMANTIC_CACHE": "false",
+        "CLARITY_WARMUP": "false",
+        # fixed 1000 character chunks, so the corpus sizes are exact in chunks (see PARAGRAPH_CHARS)
+        "CLARITY_CHUNKER": "recursive",
+        "CLARITY_CHUNK_TOKENS": "250",
+        "CLARITY_CHUNK_OVERLAP_TOKENS": "12",
+        "CLARITY_VECTOR_BACKEND": options["vector_backend"],
+        "CLARITY_VECTOR_DTYPE": options["vector_dtype"],
+        "CLARITY_VECTOR_INDEX": options["vector_index"],
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Wraps process_file's collaborators to time the load, embed and upsert stages.
+# split is what's left of process_file's time (splitting plus catalog / lexical index bookkeeping)
+class _StageTimer:
+    def __init__(self, main, db):
+        self.seconds = {"load": 0.0, "embed": 0.0, "upsert": 0.0}
+        load_pages = main.load_pages
+        def timed_load_pages(*args, **kwargs):
+            pages = load_pages(*args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    page = next(pages)
+                except StopIteration:
+                    self.seconds["load"] += time.perf_counter() - start
+                    return
+                self.seconds["load"] += time.perf_counter() - start
+                yield page
+        main.load_pages = timed_load_pages
+
+        embeddings = db.get_embeddings()
+        embed_documents = embeddings.embed_documents
+        def timed_embed_documents(texts):
+            start = time.perf_counter()
+            try:
+                return embed_documents(texts)
+            finally:
+                self.seconds["embed"] += time.perf_counter() - start
+        embeddings.embed_documents = timed_embed_documents
+
+        # add_documents embeds and then upserts, the embed time is taken out again
+        vector_db = db.get_db()
+        add_documents = vector_db.add_documents
+        def timed_add_documents(documents, **kwargs):
+            start, embedded = time.perf_counter(), self.seconds["embed"]
+            try:
+                return add_documents(documents, **kwargs)
+            finally:
+                self.seconds["upsert"] += time.perf_counter() - start - (self.seconds["embed"] - embedded)
+        vector_db.add_documents = timed_add_documents
+
+def _bench_corpus(data_dir: str, chunks: int, options: dict) -> dict:
+    _configure(data_dir, options)
+    import db, main
+
+    rng = random.Random(options["seed"])
+    words, weights = _vocabulary(options["seed"])
+    chunks_per_document = options["chunks_per_document"]
+    documents = max(1, chunks // chunks_per_document)
+    corpus_dir = os.path.join(data_dir, "corpus")
+    os.makedirs(corpus_dir)
+    timer = _StageTimer(main, db)
+
+    # Ingest (only process_file is timed, not writing the synthetic files)
+    ingest_seconds = 0.0
+    for i in range(documents):
+        path = os.path.join(corpus_dir, f"doc{i:07d}.txt")
+        _write_document(path, min(chunks_per_document, chunks - i * chunks_per_document), rng, words, weights)
+        start = time.perf_counter()
+        if not main.process_file(path, f"doc{i:07d}"):
+            raise RuntimeError(f"process_file failed for doc{i:07d}")
+        ingest_seconds += time.perf_counter() - start
+        os.remove(path)
+    stored = db.count_vectors()
+    stages = dict(timer.seconds)
+    stages["split"] = max(0.0, ingest_seconds - sum(stages.values()))
+
+    # Listing sources
+    full, page = [], []
+    for _ in range(options["repeats"]):
+        start = time.perf_counter()
+        main.get_all_sources()
+        full.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        main.get_all_sources(offset=documents // 2, limit=100)
+        page.append(time.perf_counter() - start)
+
+    # Retrieval (distinct queries so the query embedding LRU doesn't hide the embedding cost)
+    retrieval = {}
+    main._get_lexical_index()   # loaded once, not part of the query latency
+    for mode in ("vector", "hybrid"):
+        main.RETRIEVAL_MODE = mode
+        samples = []
+        for i in range(options["queries"]):
+            query = " ".join(rng.choices(words, weights, k=rng.randint(2, 5))) + f" q{mode}{i}"
+            start = time.perf_counter()
+            main._retrieve(query)
+            samples.append(time.perf_counter() - start)
+        retrieval[mode] = _percentiles(samples)
+
+    return {
+        "chunks": chunks,
+        "documents": documents,
+        "chunks_stored": stored,
+        "ingest": {
+            "seconds": round(ingest_seconds, 3),
+            "chunks_per_second": round(stored / ingest_seconds, 1) if ingest_seconds else None,
+            "stage_seconds": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+            "stage_chunks_per_second": {stage: round(stored / seconds, 1) if seconds else None for stage, seconds in stages.items()},
+        },
+        "get_all_sources": {"all": _percentiles(full), "page_of_100": _percentiles(page)},
+        "retrieval": retrieval,
+    }
+
+# Map reduce fan-out of summarize_file for one document of `chunks` chunks
+def _bench_summary(data_dir: str, chunks: int, options: dict) -> dict:
+    _configure(data_dir, options)
+    import main
+
+    rng = random.Random(options["seed"])
+    words, weights = _vocabulary(options["seed"])
+    path = os.path.join(data_dir, "notes.txt")
+    _write_document(path, chunks, rng, words, weights)
+    main.process_file(path, "notes")
+
+    # record the fan-out summarize_texts reports and count the LLM calls it makes
+    runs, calls = [], {"count": 0}
+    summarize_texts = main.summarize_texts
+    def recording_summarize_texts(*args, **kwargs):
+        result = summarize_texts(*args, **kwargs)
+        runs.append(result)
+        return result
+    main.summarize_texts = recording_summarize_texts
+    model = main.get_model()
+    generate = model._generate
+    def counting_generate(*args, **kwargs):
+        calls["count"] += 1
+        return generate(*args, **kwargs)
+    object.__setattr__(model, "_generate", counting_generate)
+
+    start = time.perf_counter()
+    result = main.summarize_file("notes")
+    seconds = time.perf_counter() - start
+    if not runs or not result:
+        raise RuntimeError(f"summarize_file failed: {result}")
+    return {
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "llm_calls": calls["count"],
+        "map_batches": runs[0]["map_batches"],
+        "map_calls": runs[0]["map_calls"],
+        "collapse_rounds": runs[0]["collapse_rounds"],
+    }
+
+# Chunking throughput of both chunkers on one document of `megabytes` MB (in memory, no store involved)
+def _bench_chunking(data_dir: str, megabytes: int, options: dict) -> dict:
+    _configure(data_dir, options)
+    from chunking import ChunkingOptions, make_chunker
+
+    rng = random.Random(options["seed"])
+    words, weights = _vocabulary(options["seed"])
+    path = os.path.join(data_dir, "large.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        written, section = 0, 0
+        while written < megabytes * 1024 * 1024:
+            section += 1
+            f.write(f"## Section {section}\n\n")
+            for _ in range(SECTION_PARAGRAPHS):
+                paragraph = " ".join(rng.choices(words, weights, k=rng.randint(20, 200))) + ".\n\n"
+                written += f.write(paragraph)
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    results = {"megabytes": megabytes, "chunkers": {}}
+    for chunker in ("structure", "recursive"):
+        start = time.perf_counter()
+        splitter = make_chunker(ChunkingOptions(chunker=chunker, chunk_tokens=256, overlap_tokens=32))
+        chunks = splitter.feed(text) + splitter.finish()
+        seconds = time.perf_counter() - start
+        results["chunkers"][chunker] = {
+            "seconds": round(seconds, 3),
+            "megabytes_per_second": round(megabytes / seconds, 2),
+            "chunks": len(chunks),
+        }
+    return results
+
+# Each benchmark runs in a fresh interpreter with an empty data directory (removed afterwards)
+# so settings, module state and caches never leak between runs
+def _isolated(fn, size: int, options: dict) -> dict:
+    data_dir = tempfile.mkdtemp(prefix=f"clarity-bench-{size}-", dir=options["data_dir"])
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return pool.submit(fn, data_dir, size, options).result()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _sizes(value: str) -> list[int]:
+    return [int(size) for size in value.split(",") if size]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest, listing, retrieval and summarization on synthetic corpora")
+    parser.add_argument("--sizes", type=_sizes, default=_sizes("1000,10000,100000"), help="corpus sizes in chunks (e.g. 1000,10000,100000,1000000)")
+    parser.add_argument("--summary-sizes", type=_sizes, default=_sizes("10,100,1000"), help="document sizes in chunks for the summarization fan-out")
+    parser.add_argument("--chunking-sizes", type=_sizes, default=_sizes("1,4,16"), help="document sizes in MB for the chunking throughput")
+    parser.add_argument("--chunks-per-document", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200, help="retrieval queries per mode")
+    parser.add_argument("--repeats", type=int, default=50, help="get_all_sources calls per variant")
+    parser.add_argument("--embedding-dim", type=int, default=384)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per stub LLM call")
+    parser.add_argument("--vector-backend", choices=("chroma", "numpy"), default="chroma")
+    parser.add_argument("--vector-dtype", choices=("float32", "float16", "int8"), default="float32", help="numpy backend only")
+    parser.add_argument("--vector-index", choices=("flat", "ivf"), default="flat", help="numpy backend only")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=None, help="where the temporary stores go (system temp dir by default)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    options = {
+        "chunks_per_document": args.chunks_per_document, "queries": args.queries, "repeats": args.repeats,
+        "embedding_dim": args.embedding_dim, "llm_latency": args.llm_latency, "seed": args.seed, "data_dir": args.data_dir,
+        "vector_backend": args.vector_backend, "vector_dtype": args.vector_dtype, "vector_index": args.vector_index,
+    }
+    results = {
+        "meta": {
+            "timestamp": time.time(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": options,
+        },
+        "corpora": [],
+        "summaries": [],
+        "chunking": [],
+    }
+    for chunks in args.sizes:
+        print(f"Benchmarking a corpus of {chunks} chunks ...")
+        results["corpora"].append(_isolated(_bench_corpus, chunks, options))
+    for chunks in args.summary_sizes:
+        print(f"Benchmarking the summary of a {chunks} chunk document ...")
+        results["summaries"].append(_isolated(_bench_summary, chunks, options))
+    for megabytes in args.chunking_sizes:
+        print(f"Benchmarking chunking of a {megabytes} MB document ...")
+        results["chunking"].append(_isolated(_bench_chunking, megabytes, options))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os, sys, json, time, shutil, argparse, tempfile, zipfile
+
+## This File ingests many files from the command line ##
+# Accepts .txt / .pdf files, directories (searched recursively) and .zip archives.
+# Runs the ingestion in this process (stop the API first, it writes to the same store), or sends
+# everything to a running API's /upload/bulk with --api and waits for the job.
+# Usage: python bulk_ingest.py notes/ week1.pdf lectures.zip [--api http://localhost:8000]
+
+# Expand the arguments into [(path, name)], archives are extracted into `temp_dir`
+def collect_files(paths: list[str], temp_dir: str, max_files: int, max_bytes: int) -> list[tuple[str, str]]:
+    from parsing import SUPPORTED_EXTENSIONS, extract_archive
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend((os.path.join(root, name), os.path.relpath(os.path.join(root, name), path)) for name in sorted(names)
+                             if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS)
+        elif path.lower().endswith(".zip"):
+            files.extend(extract_archive(path, temp_dir, max_files, max_bytes))
+        elif os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS:
+            files.append((path, os.path.basename(path)))
+        else:
+            print(f"Skipping {path}: unsupported file type", file=sys.stderr)
+    return files
+
+def ingest_locally(paths: list[str], chunking: dict, notebook: str = None) -> list[dict]:
+    from config import BULK_UPLOAD_MAX_FILES, BULK_UPLOAD_MAX_BYTES, DEFAULT_NOTEBOOK
+    from chunking import ChunkingOptions
+    import main
+    options = ChunkingOptions()
+    for name, value in chunking.items():
+        setattr(options, "overlap_tokens" if name == "chunk_overlap" else name, value)
+    temp_dir = tempfile.mkdtemp(prefix="clarity-bulk-")
+    try:
+        files = collect_files(paths, temp_dir, BULK_UPLOAD_MAX_FILES, BULK_UPLOAD_MAX_BYTES)
+        return main.process_files(files, chunking=options.validate(), notebook=notebook or DEFAULT_NOTEBOOK)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def ingest_through_api(paths: list[str], api_url: str, chunking: dict, notebook: str = None,
+                       poll_interval: float = 1.0) -> list[dict]:
+    import requests
+    headers = {"X-Notebook": notebook} if notebook else {}
+    # Directories are zipped up so the server receives a single archive for them
+    temp_dir = tempfile.mkdtemp(prefix="clarity-bulk-")
+    try:
+        uploads = []
+        for path in paths:
+            if os.path.isdir(path):
+                archive_path = os.path.join(temp_dir, f"{os.path.basename(os.path.abspath(path))}.zip")
+                with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                    for root, _, names in os.walk(path):
+                        for name in names:
+                            archive.write(os.path.join(root, name), os.path.relpath(os.path.join(root, name), path))
+                uploads.append(archive_path)
+            else:
+                uploads.append(path)
+        handles = [open(path, "rb") for path in uploads]
+        try:
+            response = requests.post(f"{api_url}/upload/bulk", params=chunking, headers=headers,
+                                     files=[("files", (os.path.basename(path), handle)) for path, handle in zip(uploads, handles)])
+        finally:
+            for handle in handles:
+                handle.close()
+        response.raise_for_status()
+        job = response.json()
+        while job["status"] in ("queued", "running"):
+            time.sleep(poll_interval)
+            job = requests.get(f"{api_url}/jobs/{job['job_id']}", headers=headers).json()
+            print(f"{job['files_done']}/{job['files_total'] or '?'} files, {job['chunks_embedded']} chunks embedded", file=sys.stderr)
+        return job["results"]
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest many notes at once")
+    parser.add_argument("paths", nargs="+", help=".txt / .pdf files, directories or .zip archives")
+    parser.add_argument("--api", help="URL of a running API (ingests in this process when not given)")
+    parser.add_argument("--notebook", help="notebook to ingest into (the default notebook when not given)")
+    parser.add_argument("--chunker", choices=("structure", "recursive"), help="chunking strategy (default from the config)")
+    parser.add_argument("--chunk-tokens", type=int, help="chunk size in tokens")
+    parser.add_argument("--chunk-overlap", type=int, help="tokens shared by consecutive chunks")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    chunking = {name: value for name, value in (("chunker", args.chunker), ("chunk_tokens", args.chunk_tokens),
+                                                ("chunk_overlap", args.chunk_overlap)) if value is not None}
+    results = (ingest_through_api(args.paths, args.api.rstrip("/"), chunking, args.notebook) if args.api
+               else ingest_locally(args.paths, chunking, args.notebook))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            detail = f"{result['chunks']} chunks" if result["status"] == "succeeded" else (result["error"] or "")
+            if result.get("unchanged"):
+                detail += ", unchanged"
+            print(f"{result['status']:<10} {result['file_name']:<40} {detail}")
+    failed = sum(1 for result in results if result["status"] != "succeeded")
+    print(f"{len(results) - failed} of {len(results)} files ingested", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
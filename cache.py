@@ -0,0 +1,214 @@
+import os, json, time, sqlite3, hashlib, threading
+from array import array
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+from config import CACHE_BACKEND, CACHE_PATH
+from metrics import span
+
+## This File holds the persistent caches used by the backend ##
+
+# Counters shared by every cache backend
+class _CacheStats:
+    def _init_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Hit / miss counters since this process started
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def get(self, key: str):
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value):
+        self.set_many({key: value})
+
+# In-process key/value store bounded to `max_entries` (LRU), entries expire after `ttl` seconds
+# Not shared between workers and lost on restart, use it for tests or single worker setups
+class MemoryCache(_CacheStats):
+    backend = "memory"
+
+    def __init__(self, max_entries: int, ttl: float = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (value, created_at), oldest first
+        self._lock = threading.Lock()
+        self._init_stats()
+
+    def get_many(self, keys: list[str]) -> dict:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                if entry and (self.ttl is None or now - entry[1] < self.ttl):
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+                    self.hits += 1
+                else:
+                    self._entries.pop(key, None)
+                    self.misses += 1
+        return found
+
+    def set_many(self, items: dict):
+        now = time.time()
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (value, now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+# Disk-backed key/value store bounded to `max_entries`, evicting the least recently used entries
+# Entries expire after `ttl` seconds. The sqlite file is shared by every worker and survives restarts
+class SQLiteCache(_CacheStats):
+    backend = "sqlite"
+
+    def __init__(self, path: str, table: str, max_entries: int, ttl: float = None, dumps=json.dumps, loads=json.loads):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.dumps, self.loads = dumps, loads   # how values are written to / read from disk
+        self._init_stats()
+        self._lock = threading.Lock()
+        # one shared connection, WAL lets other worker processes read while we write
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value BLOB, last_used REAL, created_at REAL)"
+        )
+        # caches created before entries could expire have no created_at column
+        columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+        if "created_at" not in columns:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN created_at REAL")
+            self._conn.execute(f"UPDATE {table} SET created_at = last_used")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table}(last_used)")
+        self._conn.commit()
+
+    # Returns {key: value} for every key found in the cache
+    def get_many(self, keys: list[str]) -> dict:
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        oldest = now - self.ttl if self.ttl is not None else float("-inf")
+        with self._lock:
+            # stay well below sqlite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({marks}) AND created_at >= ?", batch + [oldest]
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = self.loads(value)
+                # mark hits as recently used so they survive eviction
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE {self.table} SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [now] + [key for key, _ in rows],
+                    )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    # Stores every (key, value) pair then evicts the oldest entries above the size bound
+    def set_many(self, items: dict):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, last_used, created_at) VALUES (?, ?, ?, ?)",
+                [(key, self.dumps(value), now, now) for key, value in items.items()],
+            )
+            count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+# Builds the cache backend selected in the config ("sqlite" or "memory")
+def make_cache(name: str, max_entries: int, ttl: float = None, backend: str = None, **sqlite_options):
+    backend = backend or CACHE_BACKEND
+    if backend == "memory":
+        return MemoryCache(max_entries, ttl)
+    if backend == "sqlite":
+        return SQLiteCache(CACHE_PATH, name, max_entries, ttl, **sqlite_options)
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+# Embeddings are stored as packed float32 instead of JSON to keep the cache small
+def _pack_vector(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+def _unpack_vector(blob: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+# Wraps an embedding function so each unique chunk text is only embedded once per model
+class CachedEmbeddings(Embeddings):
+    def __init__(self, underlying: Embeddings, model_name: str, path: str, max_entries: int):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache = SQLiteCache(path, "embeddings", max_entries, dumps=_pack_vector, loads=_unpack_vector)
+
+    # Cache key is the embedding model + a hash of the chunk text
+    def _key(self, text: str) -> str:
+        return f"{self.model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with span("embed"):
+            keys = [self._key(text) for text in texts]
+            cached = self.cache.get_many(keys)
+            # only send text we have never seen (once, even if it repeats in this batch)
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in cached and key not in missing:
+                    missing[key] = text
+            if missing:
+                vectors = self.underlying.embed_documents(list(missing.values()))
+                fresh = dict(zip(missing.keys(), vectors))
+                self.cache.set_many(fresh)
+                cached.update(fresh)
+            return [cached[key] for key in keys]
+
+    # Queries are short and rarely repeat, send them straight through
+    def embed_query(self, text: str) -> list[float]:
+        return self.underlying.embed_query(text)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
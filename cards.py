@@ -0,0 +1,94 @@
+import json
+
+## This File parses flashcards out of the model's (streamed) JSON output ##
+
+# JSON schema the model's reply is constrained to
+FLASHCARD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "flash_cards": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "answer": {"type": "string"},
+                },
+                "required": ["question", "answer"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["flash_cards"],
+    "additionalProperties": False,
+}
+
+# OpenAI response_format for structured output following FLASHCARD_SCHEMA
+FLASHCARD_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "flash_cards", "strict": True, "schema": FLASHCARD_SCHEMA},
+}
+
+# A card needs a non empty question and answer
+def _as_card(value):
+    if not isinstance(value, dict):
+        return None
+    question, answer = value.get("question"), value.get("answer")
+    if not isinstance(question, str) or not isinstance(answer, str):
+        return None
+    if not question.strip() or not answer.strip():
+        return None
+    return {"question": question.strip(), "answer": answer.strip()}
+
+# Feed the reply as it streams in, every card is returned as soon as its JSON object is complete.
+# Only innermost objects are considered, so it works whether the cards are wrapped in
+# {"flash_cards": [...]}, a bare list or a ```json code block, and a malformed card
+# (or a reply cut off half way) only loses that card instead of the whole deck
+class CardStreamParser:
+    def __init__(self):
+        self.cards = []
+        self._buffer = []
+        self._pos = 0
+        self._stack = []    # [start position, has nested container] for each open { or [
+        self._in_string = False
+        self._escaped = False
+        self._questions = set()
+
+    def feed(self, text: str) -> list[dict]:
+        new_cards = []
+        for char in text:
+            self._buffer.append(char)
+            pos = self._pos
+            self._pos += 1
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._stack:
+                    self._stack[-1][1] = True
+                self._stack.append([pos, False])
+            elif char in "}]" and self._stack:
+                start, has_child = self._stack.pop()
+                if char == "}" and not has_child:
+                    card = self._parse("".join(self._buffer[start:pos + 1]))
+                    if card:
+                        new_cards.append(card)
+        self.cards.extend(new_cards)
+        return new_cards
+
+    def _parse(self, candidate: str):
+        try:
+            card = _as_card(json.loads(candidate))
+        except ValueError:
+            return None
+        # drop repeated questions
+        if card is None or card["question"].lower() in self._questions:
+            return None
+        self._questions.add(card["question"].lower())
+        return card
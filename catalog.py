@@ -0,0 +1,214 @@
+import os, time, sqlite3, threading
+from typing import Optional
+
+## This File keeps a small catalog of the uploaded documents next to the vector database ##
+# Listing documents reads this table instead of scanning every chunk in Chroma.
+# It also holds the live chunk ids of each document: a new version's chunks are written to the store first
+# and only become visible when `replace_document` swaps the id set in one transaction (readers filter on it).
+# Where each chunk sits in its document (position, pdf page, character offsets, section) is recorded with it,
+# so it changes with the version even for chunks whose text (and so id and vector) stayed the same.
+# Every change to a document's chunks is logged, so API workers can catch up on what other workers changed
+
+SQLITE_MAX_VARIABLES = 900   # ids per IN (...) query
+CHANGES_KEPT = 10000          # latest change log rows kept, a worker further behind reloads its indexes
+CHUNK_POSITION_COLUMNS = (("page", "INTEGER"), ("start_offset", "INTEGER"), ("end_offset", "INTEGER"), ("section", "TEXT"))
+
+class Catalog:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                source TEXT PRIMARY KEY,
+                chunk_count INTEGER NOT NULL,
+                byte_size INTEGER,
+                page_count INTEGER,
+                uploaded_at REAL NOT NULL,
+                content_hash TEXT
+            )""")
+        # catalogs created before content hashes were recorded
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(documents)")]
+        if "content_hash" not in columns:
+            self._conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+        # fingerprint of the uploaded file and its chunking settings, an identical upload is not ingested again
+        if "file_hash" not in columns:
+            self._conn.execute("ALTER TABLE documents ADD COLUMN file_hash TEXT")
+        # live chunks of each document, in document order
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                page INTEGER,
+                start_offset INTEGER,
+                end_offset INTEGER,
+                section TEXT
+            )""")
+        # catalogs created before chunk positions were recorded
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")]
+        for column, column_type in CHUNK_POSITION_COLUMNS:
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE chunks ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_by_source ON chunks (source, position)")
+        # one row per replaced / deleted document, the generation grows with every change
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS changes (
+                generation INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL
+            )""")
+        self._written = set()   # generations of the changes made through this instance
+        # set once the catalog has been filled from an existing vector store
+        self._conn.execute("CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    # Make `chunk_ids` the live chunks of `source` and update its entry, atomically
+    # `positions` gives (page, start offset, end offset, section) for each chunk
+    # Returns the chunk ids of the version that was replaced
+    def replace_document(self, source: str, chunk_ids: list[str], byte_size: Optional[int] = None,
+                         page_count: Optional[int] = None, content_hash: Optional[str] = None,
+                         positions: Optional[list[tuple]] = None, file_hash: Optional[str] = None) -> list[str]:
+        positions = positions or [(None, None, None, None)] * len(chunk_ids)
+        with self._lock:
+            try:
+                old_ids = [row[0] for row in self._conn.execute(
+                    "SELECT chunk_id FROM chunks WHERE source = ?", (source,))]
+                self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (chunk_id, source, position, page, start_offset, end_offset, section) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(chunk_id, source, position, *location)
+                     for position, (chunk_id, location) in enumerate(zip(chunk_ids, positions))],
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (source, chunk_count, byte_size, page_count, uploaded_at, content_hash, file_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (source, len(chunk_ids), byte_size, page_count, time.time(), content_hash, file_hash),
+                )
+                generation = self._log_change(source)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._written.add(generation)
+        return old_ids
+
+    # Live chunk ids of a document, in document order
+    def chunk_ids(self, source: str) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE source = ? ORDER BY position", (source,))]
+
+    # The chunks among `chunk_ids` that belong to a live document version: {chunk id: location}
+    # Locations hold source, position, page, start_offset, end_offset and section (unset ones left out)
+    def live_chunks(self, chunk_ids) -> dict[str, dict]:
+        chunk_ids = list(chunk_ids)
+        live = {}
+        with self._lock:
+            for i in range(0, len(chunk_ids), SQLITE_MAX_VARIABLES):
+                part = chunk_ids[i:i + SQLITE_MAX_VARIABLES]
+                for row in self._conn.execute(
+                        f"SELECT * FROM chunks WHERE chunk_id IN ({','.join('?' * len(part))})", part):
+                    live[row["chunk_id"]] = {key: row[key] for key in row.keys() if key != "chunk_id" and row[key] is not None}
+        return live
+
+    # Live chunk ids of `source` from `first` to `last` position (inclusive), in document order
+    def chunk_range(self, source: str, first: int, last: int) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE source = ? AND position BETWEEN ? AND ? ORDER BY position",
+                (source, first, last))]
+
+    def set_content_hash(self, source: str, content_hash: str):
+        with self._lock:
+            self._conn.execute("UPDATE documents SET content_hash = ? WHERE source = ?", (content_hash, source))
+            self._conn.commit()
+
+    def delete(self, source: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM documents WHERE source = ?", (source,))
+            generation = self._log_change(source)
+            self._conn.commit()
+            self._written.add(generation)
+
+    # Log a change and forget the ones older than the latest CHANGES_KEPT
+    def _log_change(self, source: str) -> int:
+        generation = self._conn.execute("INSERT INTO changes (source) VALUES (?)", (source,)).lastrowid
+        pruned_through = generation - CHANGES_KEPT
+        if self._conn.execute("DELETE FROM changes WHERE generation <= ?", (pruned_through,)).rowcount:
+            self._conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('changes_pruned_through', ?)",
+                               (str(pruned_through),))
+            self._written = {written for written in self._written if written > pruned_through}
+        return generation
+
+    # Generation of the latest change
+    def generation(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(generation), 0) FROM changes").fetchone()[0]
+
+    # Documents changed by other processes (or other catalog instances) after `generation`,
+    # and the latest generation: (generation, [sources])
+    # Sources are None when changes after `generation` were already pruned from the log
+    def changes_since(self, generation: int) -> tuple[int, Optional[list[str]]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM catalog_meta WHERE key = 'changes_pruned_through'").fetchone()
+            if row and generation < int(row[0]):
+                return self._conn.execute("SELECT MAX(generation) FROM changes").fetchone()[0], None
+            rows = self._conn.execute(
+                "SELECT generation, source FROM changes WHERE generation > ? ORDER BY generation", (generation,)).fetchall()
+        sources = list(dict.fromkeys(row[1] for row in rows if row[0] not in self._written))
+        return (rows[-1][0] if rows else generation), sources
+
+    def get(self, source: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE source = ?", (source,)).fetchone()
+        return dict(row) if row else None
+
+    # One page of documents ordered by name
+    def list(self, offset: int = 0, limit: Optional[int] = None) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM documents ORDER BY source LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def is_backfilled(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM catalog_meta WHERE key = 'backfilled'").fetchone()
+        return row is not None
+
+    # Replace the whole catalog with {source: chunk_count} (used once for stores created before the catalog existed)
+    def backfill(self, chunk_counts: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.executemany(
+                "INSERT INTO documents (source, chunk_count, uploaded_at) VALUES (?, ?, ?)",
+                [(source, count, now) for source, count in chunk_counts.items()],
+            )
+            self._conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('backfilled', ?)", (str(now),))
+            self._conn.commit()
+
+    def is_chunks_backfilled(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM catalog_meta WHERE key = 'chunks_backfilled'").fetchone()
+        return row is not None
+
+    # Mark every chunk already in the store live ({source: [chunk ids in document order]}),
+    # used once for stores created before live chunk ids were recorded
+    def backfill_chunks(self, chunk_ids: dict):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (chunk_id, source, position) VALUES (?, ?, ?)",
+                [(chunk_id, source, position) for source, ids in chunk_ids.items() for position, chunk_id in enumerate(ids)],
+            )
+            self._conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('chunks_backfilled', ?)", (str(time.time()),))
+            self._conn.commit()
@@ -0,0 +1,211 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+from config import CHUNKER, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+from tokens import count_tokens
+
+## This File splits the text of a document into chunks ##
+# "structure" (default) sizes chunks in tokens and cuts at headings, paragraphs, sentences and pdf pages.
+# "recursive" is the previous character based splitter (about 4 characters per token).
+# Both take the text page by page (feed / finish) and record where every chunk came from:
+# the pdf page, the character offsets (within the page for pdfs, within the file for text files)
+# and the heading the chunk falls under
+
+CHUNKERS = ("structure", "recursive")
+
+# Markdown headings, numbered Title Case headings of at least two words ("2.1 Cell Structure",
+# "Chapter 3: Genetics", "Chapter 3") and ALL CAPS lines of at least two words ("CELL BIOLOGY").
+# A lone number, term or acronym ("2023", "1. Glycolysis", "DNA") is not a heading
+_TITLE_WORD = r"(?:[A-Z][\w'-]*|of|and|the|in|to|for|a|an|on|&)"
+HEADING_PATTERN = re.compile(
+    r"#{1,6}\s+\S.*"
+    r"|(?i:chapter|section|part|unit|lecture|week)\s+(?:\d+|[IVXLC]+)\b(?:[:\s]\s*[A-Z][\w'-]*(?:\s+" + _TITLE_WORD + r")*)?"
+    r"|(?:[IVXLC]+\.|\d+(?:\.\d+)*\.?)[:\s]\s*[A-Z][\w'-]*(?:\s+" + _TITLE_WORD + r")+"
+    r"|(?=(?:[^a-z\n]*?\b[A-Z]{2,}){2})[^a-z\n]*"
+)
+# Lines of a numbered or bulleted list ("1. ...", "2) ...", "- ...")
+LIST_ITEM = re.compile(r"\s*(?:\d+[.)]|[IVXLC]+\.|[-*•])\s")
+HEADING_MAX_CHARS = 100
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+LINE_BREAK = re.compile(r"\n")
+# ends of sentences and single line breaks (bullets, short lines in notes)
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n\s*")
+WORD = re.compile(r"\S+\s*")
+
+@dataclass
+class ChunkingOptions:
+    chunker: str = CHUNKER
+    chunk_tokens: int = CHUNK_TOKENS
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+
+    def validate(self):
+        if self.chunker not in CHUNKERS:
+            raise ValueError(f"Unknown chunker '{self.chunker}' (expected one of {', '.join(CHUNKERS)})")
+        if self.chunk_tokens < 16:
+            raise ValueError("chunk_tokens must be at least 16")
+        if not 0 <= self.overlap_tokens < self.chunk_tokens // 2:
+            raise ValueError("overlap_tokens must be at least 0 and less than half of chunk_tokens")
+        return self
+
+@dataclass
+class Chunk:
+    text: str
+    page: Optional[int]      # 1 based, pdfs only
+    start: int               # character offsets of the chunk in the page (pdf) or file (txt)
+    end: int
+    section: Optional[str]   # closest heading above the chunk
+
+# `in_list`: the lines around it are list items, so a numbered line is one of them and not a heading
+def _is_heading(line: str, in_list: bool = False) -> bool:
+    line = line.strip()
+    if in_list and LIST_ITEM.match(line):
+        return False
+    return 2 < len(line) <= HEADING_MAX_CHARS and HEADING_PATTERN.fullmatch(line) is not None and line[-1] not in ".,;:"
+
+# Spans [start, end) of the pieces `pattern` separates in text[start:end]
+def _spans(pattern, text: str, start: int, end: int):
+    for match in pattern.finditer(text, start, end):
+        if match.start() > start:
+            yield start, match.start()
+        start = match.end()
+    if end > start:
+        yield start, end
+
+# Packs sentences into chunks of at most `chunk_tokens` tokens.
+# A chunk is closed before a paragraph that doesn't fit, and always at a heading or a new pdf page.
+# Consecutive chunks share whole sentences worth up to `overlap_tokens` tokens (not across headings / pages).
+# Every character is looked at a constant number of times, so the time is linear in the size of the document
+class StructureChunker:
+    def __init__(self, options: ChunkingOptions):
+        self.chunk_tokens = options.chunk_tokens
+        self.overlap_tokens = options.overlap_tokens
+        self._units = []   # pending sentences: (text, start, end, tokens)
+        self._tokens = 0
+        self._page = None
+        self._offset = 0   # offset of the current text in its page / file
+        self._section = None
+        self._chunk_section = None
+        self._has_body = False   # the pending sentences are more than a heading
+
+    def feed(self, text: str, page: Optional[int] = None) -> list[Chunk]:
+        chunks = []
+        if page != self._page:
+            self._close(chunks, overlap=False)
+            self._page, self._offset = page, 0
+        base, self._offset = self._offset, self._offset + len(text)
+        # ends of the lines next to a list item (blank lines between the items don't end the list)
+        lines = [(a, b) for a, b in _spans(LINE_BREAK, text, 0, len(text)) if not text[a:b].isspace()]
+        listed = [LIST_ITEM.match(text, a, b) is not None for a, b in lines]
+        in_list = {lines[i][1] for i in range(len(lines))
+                   if (i > 0 and listed[i - 1]) or (i + 1 < len(lines) and listed[i + 1])}
+        for start, end in _spans(PARAGRAPH_BREAK, text, 0, len(text)):
+            # headings can also sit inside a paragraph (pdf text rarely has blank lines)
+            body_start = start
+            for line_start, line_end in _spans(LINE_BREAK, text, start, end):
+                if _is_heading(text[line_start:line_end], line_end in in_list):
+                    self._paragraph(chunks, text, body_start, line_start, base)
+                    heading = text[line_start:line_end].strip()
+                    self._close(chunks, overlap=False)
+                    self._section = heading.lstrip("#").strip()
+                    self._chunk_section = self._section
+                    self._add((heading + "\n", base + line_start, base + line_end, count_tokens(heading)), body=False)
+                    body_start = line_end
+            self._paragraph(chunks, text, body_start, end, base)
+            # paragraphs are joined back with a blank line
+            if self._units:
+                unit_text, unit_start, unit_end, unit_tokens = self._units[-1]
+                self._units[-1] = (unit_text.rstrip() + "\n\n", unit_start, unit_end, unit_tokens)
+        return chunks
+
+    def finish(self) -> list[Chunk]:
+        chunks = []
+        self._close(chunks, overlap=False)
+        return chunks
+
+    def _paragraph(self, chunks: list, text: str, start: int, end: int, base: int):
+        sentences = self._sentences(text, start, end, base)
+        if not sentences:
+            return
+        tokens = sum(sentence[3] for sentence in sentences)
+        if self._has_body and self._tokens + tokens > self.chunk_tokens and tokens <= self.chunk_tokens:
+            self._close(chunks)
+        for sentence in sentences:
+            if self._has_body and self._tokens + sentence[3] > self.chunk_tokens:
+                self._close(chunks)
+            self._add(sentence)
+
+    # Sentences of text[start:end], sentences over the chunk size are cut between words.
+    # Each keeps the whitespace that follows it, so joining them gives back the original text
+    def _sentences(self, text: str, start: int, end: int, base: int) -> list[tuple]:
+        spans = []
+        for sentence_start, sentence_end in _spans(SENTENCE_BREAK, text, start, end):
+            if count_tokens(text[sentence_start:sentence_end]) <= self.chunk_tokens:
+                spans.append((sentence_start, sentence_end))
+                continue
+            piece_start, piece_tokens = sentence_start, 0
+            for word in WORD.finditer(text, sentence_start, sentence_end):
+                word_tokens = count_tokens(word.group())
+                if piece_tokens and piece_tokens + word_tokens > self.chunk_tokens:
+                    spans.append((piece_start, word.start()))
+                    piece_start, piece_tokens = word.start(), 0
+                piece_tokens += word_tokens
+            spans.append((piece_start, sentence_end))
+        return [
+            (text[span_start:spans[i + 1][0] if i + 1 < len(spans) else span_end],
+             base + span_start, base + span_end, count_tokens(text[span_start:span_end]))
+            for i, (span_start, span_end) in enumerate(spans)
+        ]
+
+    def _add(self, unit: tuple, body: bool = True):
+        if not self._units:
+            self._chunk_section = self._section
+        self._units.append(unit)
+        self._tokens += unit[3]
+        self._has_body = self._has_body or body
+
+    # Emit the pending sentences as a chunk, keeping the last ones as the start of the next chunk
+    def _close(self, chunks: list, overlap: bool = True):
+        if not self._units:
+            return
+        text = "".join(unit[0] for unit in self._units).strip()
+        if text:
+            chunks.append(Chunk(text, self._page, self._units[0][1], self._units[-1][2], self._chunk_section))
+        kept, kept_tokens = [], 0
+        if overlap and self.overlap_tokens:
+            for unit in reversed(self._units[1:]):
+                if kept_tokens + unit[3] > self.overlap_tokens:
+                    break
+                kept.append(unit)
+                kept_tokens += unit[3]
+        self._units, self._tokens = kept[::-1], kept_tokens
+        self._has_body = bool(kept)
+        self._chunk_section = self._section
+
+# The character based splitter the app used before, with the same position metadata (no sections)
+class RecursiveChunker:
+    def __init__(self, options: ChunkingOptions):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        self._splitter = RecursiveCharacterTextSplitter(
+            chunk_size=options.chunk_tokens * 4,
+            chunk_overlap=options.overlap_tokens * 4,
+            separators=["\n\n","\n", ".", " ",""],  # seperators to split text in order of preference
+            add_start_index=True)
+        self._page = None
+        self._offset = 0
+
+    def feed(self, text: str, page: Optional[int] = None) -> list[Chunk]:
+        if page != self._page:
+            self._page, self._offset = page, 0
+        base, self._offset = self._offset, self._offset + len(text)
+        return [
+            Chunk(doc.page_content, page, base + doc.metadata["start_index"],
+                  base + doc.metadata["start_index"] + len(doc.page_content), None)
+            for doc in self._splitter.create_documents([text])
+        ]
+
+    def finish(self) -> list[Chunk]:
+        return []
+
+def make_chunker(options: ChunkingOptions = None):
+    options = (options or ChunkingOptions()).validate()
+    return StructureChunker(options) if options.chunker == "structure" else RecursiveChunker(options)
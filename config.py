@@ -0,0 +1,127 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+## This File holds the backend settings. Every value can be overridden from the .env file ##
+current_dir = os.path.dirname(os.path.abspath(__file__)) # get the current directory of the file
+data_directory = os.getenv("CLARITY_DATA_DIR", os.path.join(current_dir, "db"))   # everything we persist lives here
+
+# Logging: level, and whether chunk / answer text may be logged (off by default: large and private)
+LOG_LEVEL = os.getenv("CLARITY_LOG_LEVEL", "INFO").upper()
+LOG_CONTENT = os.getenv("CLARITY_LOG_CONTENT", "false").lower() in ("1", "true", "yes")
+
+# Build the model client, open the vector store and load the indexes when the API starts
+# (/readyz reports 503 until that is done). When off everything is created on first use
+WARMUP_ON_STARTUP = os.getenv("CLARITY_WARMUP", "true").lower() in ("1", "true", "yes")
+
+# Embeddings
+EMBEDDING_BACKEND = os.getenv("CLARITY_EMBEDDING_BACKEND", "openai")  # "openai" or "local" (offline hashing embedder)
+LOCAL_EMBEDDING_DIM = int(os.getenv("CLARITY_LOCAL_EMBEDDING_DIM", "384"))
+EMBEDDING_MODEL = os.getenv("CLARITY_EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_BASE_URL = os.getenv("CLARITY_EMBEDDING_BASE_URL") or None  # e.g. a local stub server for load tests
+EMBEDDING_BATCH_SIZE = int(os.getenv("CLARITY_EMBEDDING_BATCH_SIZE", "64"))  # texts per API request
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("CLARITY_EMBEDDING_MAX_CONCURRENCY", "4"))  # API requests in flight
+EMBEDDING_MAX_RETRIES = int(os.getenv("CLARITY_EMBEDDING_MAX_RETRIES", "6"))  # on rate limits / transient errors
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("CLARITY_QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+# Embedding cache (one entry per unique chunk text, ~6KB each for text-embedding-3-small)
+EMBEDDING_CACHE_PATH = os.path.join(data_directory, "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("CLARITY_EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+# Ingestion: chunks are embedded and stored this many at a time
+# (a multiple of EMBEDDING_BATCH_SIZE * EMBEDDING_MAX_CONCURRENCY keeps every embedding request slot busy)
+INGEST_BATCH_SIZE = int(os.getenv("CLARITY_INGEST_BATCH_SIZE", "256"))
+INGEST_TEXT_BLOCK_SIZE = int(os.getenv("CLARITY_INGEST_TEXT_BLOCK_SIZE", "65536"))  # chars read from a .txt file at a time
+
+# Background ingestion: number of worker threads and how many jobs may wait for one
+INGEST_WORKERS = int(os.getenv("CLARITY_INGEST_WORKERS", "2"))
+INGEST_MAX_PENDING = int(os.getenv("CLARITY_INGEST_MAX_PENDING", "32"))
+# Bulk uploads: processes parsing files in parallel, and limits on what one upload may contain
+INGEST_PARSE_WORKERS = int(os.getenv("CLARITY_INGEST_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+BULK_UPLOAD_MAX_FILES = int(os.getenv("CLARITY_BULK_UPLOAD_MAX_FILES", "500"))
+BULK_UPLOAD_MAX_BYTES = int(os.getenv("CLARITY_BULK_UPLOAD_MAX_BYTES", str(1024 ** 3)))  # uncompressed
+
+# Chunking: "structure" (token sized, cuts at headings / paragraphs / sentences / pages) or "recursive"
+# (the character splitter, chunk sizes times 4 characters). Uploads can override these per file
+CHUNKER = os.getenv("CLARITY_CHUNKER", "structure")
+CHUNK_TOKENS = int(os.getenv("CLARITY_CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CLARITY_CHUNK_OVERLAP_TOKENS", "32"))
+
+# Vector store: "chroma" (db/chroma_db) or "numpy" (memory-mapped arrays in db/vectors, one directory per notebook).
+# The numpy store can keep vectors as "float16" or "int8" and re-score the best VECTOR_RESCORE_FACTOR * k
+# candidates exactly, and switch from brute force to IVF search (only the closest IVF_PROBES lists are scanned)
+# once a notebook has IVF_MIN_ROWS chunks (IVF_LISTS 0 = square root of the number of chunks)
+VECTOR_BACKEND = os.getenv("CLARITY_VECTOR_BACKEND", "chroma")
+# URL of a shared Chroma server (vector_server.py). When set, workers send their reads and writes to it
+# over pooled HTTP connections instead of opening db/chroma_db, so the API can run several workers
+CHROMA_URL = os.getenv("CLARITY_CHROMA_URL") or None
+VECTORS_DIRECTORY = os.path.join(data_directory, "vectors")
+VECTOR_DTYPE = os.getenv("CLARITY_VECTOR_DTYPE", "float32")   # "float32", "float16" or "int8" (smallest, fastest to scan)
+VECTOR_INDEX = os.getenv("CLARITY_VECTOR_INDEX", "flat")       # "flat" or "ivf"
+VECTOR_RESCORE_FACTOR = int(os.getenv("CLARITY_VECTOR_RESCORE_FACTOR", "4"))
+IVF_LISTS = int(os.getenv("CLARITY_IVF_LISTS", "0"))
+IVF_PROBES = int(os.getenv("CLARITY_IVF_PROBES", "8"))
+IVF_MIN_ROWS = int(os.getenv("CLARITY_IVF_MIN_ROWS", "10000"))
+
+# Catalog of uploaded documents (sqlite side table next to the vector store)
+CATALOG_PATH = os.path.join(data_directory, "catalog.sqlite3")
+
+# Notebooks: each one (per user or per course) has its own collection, catalog and lexical index,
+# so retrieval, listing and deletion only touch its chunks. Requests pick one with the X-Notebook header.
+# The default notebook uses the original collection and catalog
+DEFAULT_NOTEBOOK = os.getenv("CLARITY_DEFAULT_NOTEBOOK", "default")
+NOTEBOOKS_DIRECTORY = os.path.join(data_directory, "notebooks")   # catalogs of the other notebooks
+
+# Caches for generated content: "sqlite" (shared by every worker, survives restarts) or "memory"
+CACHE_BACKEND = os.getenv("CLARITY_CACHE_BACKEND", "sqlite")
+CACHE_PATH = os.path.join(data_directory, "cache.sqlite3")
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("CLARITY_SUMMARY_CACHE_MAX_ENTRIES", "500"))
+SUMMARY_CACHE_TTL = float(os.getenv("CLARITY_SUMMARY_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+
+# Chat model
+CHAT_BACKEND = os.getenv("CLARITY_CHAT_BACKEND", "openai")  # "openai" or "stub" (offline, deterministic replies)
+CHAT_MODEL = os.getenv("CLARITY_CHAT_MODEL", "gpt-4o")
+STUB_CHAT_LATENCY = float(os.getenv("CLARITY_STUB_CHAT_LATENCY", "0"))  # seconds per stub call
+STUB_CHAT_TOKEN_DELAY = float(os.getenv("CLARITY_STUB_CHAT_TOKEN_DELAY", "0"))  # seconds between streamed stub tokens
+
+# Map reduce summarization: map batches are packed up to the map budget, the reduce prompt is kept
+# under the reduce budget by collapsing summaries in groups, and at most N LLM calls run at once
+SUMMARY_MAP_TOKEN_BUDGET = int(os.getenv("CLARITY_SUMMARY_MAP_TOKEN_BUDGET", "3000"))
+SUMMARY_REDUCE_TOKEN_BUDGET = int(os.getenv("CLARITY_SUMMARY_REDUCE_TOKEN_BUDGET", "12000"))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("CLARITY_SUMMARY_MAX_CONCURRENCY", "8"))
+SUMMARY_MAP_ANCHOR_EVERY = int(os.getenv("CLARITY_SUMMARY_MAP_ANCHOR_EVERY", "6"))  # ~chunks per batch, keeps batch boundaries stable across edits
+if SUMMARY_MAP_ANCHOR_EVERY < 1:
+    raise ValueError("CLARITY_SUMMARY_MAP_ANCHOR_EVERY must be at least 1")
+SUMMARY_MAP_CACHE_MAX_ENTRIES = int(os.getenv("CLARITY_SUMMARY_MAP_CACHE_MAX_ENTRIES", "20000"))
+
+# File locks that let worker processes coordinate (e.g. one summary generation per document at a time)
+LOCK_DIRECTORY = os.path.join(data_directory, "locks")
+
+# Flashcards: cards per deck and how many decks are kept
+FLASHCARD_COUNT = int(os.getenv("CLARITY_FLASHCARD_COUNT", "15"))
+FLASHCARD_CACHE_MAX_ENTRIES = int(os.getenv("CLARITY_FLASHCARD_CACHE_MAX_ENTRIES", "500"))
+
+# Chat retrieval: number of chunks given to the LLM
+RETRIEVAL_K = int(os.getenv("CLARITY_RETRIEVAL_K", "3"))
+# "hybrid" fuses vector and BM25 rankings, "vector" is similarity search only
+RETRIEVAL_MODE = os.getenv("CLARITY_RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_CANDIDATES = int(os.getenv("CLARITY_RETRIEVAL_CANDIDATES", "20"))  # results taken from each ranking before fusion
+RRF_K = int(os.getenv("CLARITY_RRF_K", "60"))
+# MMR picks diverse chunks among the fused candidates (lambda 1 = relevance only, 0 = diversity only)
+RETRIEVAL_MMR = os.getenv("CLARITY_RETRIEVAL_MMR", "false").lower() in ("1", "true", "yes")
+MMR_LAMBDA = float(os.getenv("CLARITY_MMR_LAMBDA", "0.5"))
+# Chunks before and after each retrieved chunk that are added to the context (0 = off)
+RETRIEVAL_NEIGHBOURS = int(os.getenv("CLARITY_RETRIEVAL_NEIGHBOURS", "0"))
+
+# Semantic answer cache (opt-in): reuse an answer when a new question is this similar (cosine)
+# to a cached one and retrieval returns the same chunks. Per worker, only for questions without chat history
+SEMANTIC_CACHE_ENABLED = os.getenv("CLARITY_SEMANTIC_CACHE", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("CLARITY_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("CLARITY_SEMANTIC_CACHE_TTL", "3600"))  # seconds
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("CLARITY_SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+# Server-side chat sessions: history over the token budget is rolled into a running summary
+SESSIONS_PATH = os.path.join(data_directory, "sessions.sqlite3")
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CLARITY_CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+CHAT_SESSION_MAX_AGE = float(os.getenv("CLARITY_CHAT_SESSION_MAX_AGE", str(30 * 24 * 3600)))  # seconds without activity
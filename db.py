@@ -1,34 +1,141 @@
-import os, shutil
+import os, re, shutil, logging, threading
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+from cache import CachedEmbeddings
+from embeddings import EmbeddingClient
+from backends import create_embeddings, model_name_of
+from config import (data_directory, DEFAULT_NOTEBOOK, VECTOR_BACKEND, CHROMA_URL, VECTORS_DIRECTORY, VECTOR_DTYPE, VECTOR_INDEX,
+                    VECTOR_RESCORE_FACTOR, IVF_LISTS, IVF_PROBES, IVF_MIN_ROWS, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES,
+                    EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_CONCURRENCY, EMBEDDING_MAX_RETRIES, QUERY_EMBEDDING_CACHE_SIZE)
 
 load_dotenv()
 
-## This File initializes the Chroma Vector Database with an OpenAI embedding function ##
-current_dir = os.path.dirname(os.path.abspath(__file__)) # get the current directory of the file
-persistent_directory = os.path.join(current_dir,"db","chroma_db")   # define path to local db
+## This File initializes the Vector Database with the configured embedding function ##
+# Every notebook is its own collection in the one persistent Chroma database (opened here, or owned by
+# the vector_server.py process when CLARITY_CHROMA_URL is set),
+# or its own directory of memory-mapped arrays with the numpy backend (numpy_store.py)
+logger = logging.getLogger(__name__)
+persistent_directory = os.path.join(data_directory,"chroma_db")   # define path to local db
+
+DEFAULT_COLLECTION = "langchain"   # the collection stores created before notebooks use
+# Also a valid Chroma collection name once prefixed (alphanumeric at both ends, at most 63 characters)
+NOTEBOOK_NAME = re.compile(r"[A-Za-z0-9](?:[A-Za-z0-9_-]{0,46}[A-Za-z0-9])?")
+
+# Nothing is created at import time: the embedding client and the store are built on first use
+# (or by the API's warm-up), so importing this module is cheap for tests and tooling
+_embeddings = None
+_embedding_client = None
+_chroma_client = None
+_vector_dbs = {}   # notebook -> Chroma / NumpyVectorStore
+_lock = threading.Lock()
+
+# Returns the notebook name, raises ValueError for names that can't be used
+def check_notebook(notebook: str) -> str:
+    if not isinstance(notebook, str) or not NOTEBOOK_NAME.fullmatch(notebook):
+        raise ValueError("Notebook names are 1-48 letters, digits, '-' or '_', starting and ending with a letter or digit")
+    return notebook
+
+def collection_name(notebook: str) -> str:
+    return DEFAULT_COLLECTION if notebook == DEFAULT_NOTEBOOK else f"notebook-{check_notebook(notebook)}"
 
 # Create embeddings
-print("\n--- Creating Embeddings ---")
-embeddings = OpenAIEmbeddings ( model = "text-embedding-3-small" )
-print("\n--- Finished creating embeddings ---")
-            
-# Initialize a persistent Chroma vectorstore
-def get_db():
-    print("\n--- Creating vector store ---") 
-    vector_db = Chroma(
-        persist_directory = persistent_directory,
-        embedding_function = embeddings
+def _create_embeddings():
+    global _embeddings, _embedding_client
+    logger.info("creating embeddings")
+    # The backend ("openai" or the offline "local" one) comes from the config
+    # The client batches requests, runs them concurrently and retries on rate limits
+    embedding_backend = create_embeddings()
+    _embedding_client = EmbeddingClient(
+        embedding_backend,
+        batch_size = EMBEDDING_BATCH_SIZE,
+        max_concurrency = EMBEDDING_MAX_CONCURRENCY,
+        max_retries = EMBEDDING_MAX_RETRIES,
+        query_cache_size = QUERY_EMBEDDING_CACHE_SIZE
+    )
+    # Put the persistent cache in front of the API so chunks we've already seen are never re-embedded
+    _embeddings = CachedEmbeddings(
+        _embedding_client,
+        model_name = model_name_of(embedding_backend),
+        path = EMBEDDING_CACHE_PATH,
+        max_entries = EMBEDDING_CACHE_MAX_ENTRIES
+    )
+    logger.info("embeddings ready backend=%s", model_name_of(embedding_backend))
+
+# Cached embedding function used by the store
+def get_embeddings() -> CachedEmbeddings:
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                _create_embeddings()
+    return _embeddings
+
+# The API client behind the cache (for its throughput stats)
+def get_embedding_client() -> EmbeddingClient:
+    get_embeddings()
+    return _embedding_client
+
+def _open_chroma(notebook: str, embedding_function) -> Chroma:
+    global _chroma_client
+    if _chroma_client is None:
+        import chromadb
+        if CHROMA_URL:
+            # the server owns the files, requests go over a pool of keep-alive connections
+            url = urlparse(CHROMA_URL)
+            logger.info("connecting to vector store url=%s", CHROMA_URL)
+            _chroma_client = chromadb.HttpClient(host=url.hostname, port=url.port or (443 if url.scheme == "https" else 80),
+                                                 ssl=url.scheme == "https")
+        else:
+            logger.info("opening vector store path=%s", persistent_directory)
+            _chroma_client = chromadb.PersistentClient(path=persistent_directory)
+    return Chroma(
+        client = _chroma_client,
+        collection_name = collection_name(notebook),
+        embedding_function = embedding_function
+    )
+
+def _open_numpy(notebook: str, embedding_function):
+    from numpy_store import NumpyVectorStore
+    return NumpyVectorStore(
+        os.path.join(VECTORS_DIRECTORY, collection_name(notebook)),
+        embedding_function,
+        dtype = VECTOR_DTYPE,
+        index = VECTOR_INDEX,
+        ivf_lists = IVF_LISTS,
+        ivf_probes = IVF_PROBES,
+        ivf_min_rows = IVF_MIN_ROWS,
+        rescore_factor = VECTOR_RESCORE_FACTOR
     )
-    print("\n--- Finished creating vector store ---") 
+
+VECTOR_BACKENDS = {"chroma": _open_chroma, "numpy": _open_numpy}
+
+# Vector store of a notebook (a collection in the shared Chroma database, or a numpy store), opened on first use
+def get_db(notebook: str = DEFAULT_NOTEBOOK):
+    vector_db = _vector_dbs.get(notebook)
+    if vector_db is None:
+        if VECTOR_BACKEND not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend '{VECTOR_BACKEND}' (expected one of {', '.join(VECTOR_BACKENDS)})")
+        embedding_function = get_embeddings()
+        with _lock:
+            vector_db = _vector_dbs.get(notebook)
+            if vector_db is None:
+                vector_db = VECTOR_BACKENDS[VECTOR_BACKEND](notebook, embedding_function)
+                _vector_dbs[notebook] = vector_db
+                logger.info("vector store ready backend=%s notebook=%s collection=%s",
+                            VECTOR_BACKEND, notebook, collection_name(notebook))
     return vector_db
 
+# Number of chunks stored for a notebook
+def count_vectors(notebook: str = DEFAULT_NOTEBOOK) -> int:
+    vector_db = get_db(notebook)
+    return vector_db._collection.count() if isinstance(vector_db, Chroma) else vector_db.count()
+
 # Delete in memory directory containing embeddings
 def delete_db():
-    if os.path.exists(persistent_directory):
-        shutil.rmtree(persistent_directory)
-        print("--- Chroma DB wiped ---")
+    directory = persistent_directory if VECTOR_BACKEND == "chroma" else VECTORS_DIRECTORY
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+        logger.info("vector store wiped path=%s", directory)
     else:
-        print("--- Chroma DB directory not found ---")
+        logger.info("vector store not found path=%s", directory)
     
\ No newline at end of file
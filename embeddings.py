@@ -0,0 +1,111 @@
+import time, random, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from langchain_core.embeddings import Embeddings
+
+## This File wraps the embedding API for throughput: batching, concurrent requests, ##
+## rate-limit aware retries and an LRU of recent query embeddings ##
+
+# Errors worth retrying: rate limits, timeouts / dropped connections and 5xx responses
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+class EmbeddingClient(Embeddings):
+    def __init__(self, underlying: Embeddings, batch_size: int, max_concurrency: int,
+                 max_retries: int, query_cache_size: int, backoff_base: float = 0.5, backoff_max: float = 30.0):
+        self.underlying = underlying
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base, self.backoff_max = backoff_base, backoff_max
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()   # query text -> vector, least recently used first
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+        self._lock = threading.Lock()
+        # Throughput counters
+        self.requests = 0
+        self.texts_embedded = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.request_seconds = 0.0
+        self.query_hits = 0
+        self.query_misses = 0
+
+    # How long to wait before retry number `attempt` (uses the server's Retry-After when it sends one)
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # exponential backoff with full jitter so concurrent requests don't retry in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    # One API request `call()` embedding `count` texts, retried on transient errors
+    def _request(self, call, count: int):
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                result = call()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                    self.rate_limited += isinstance(e, openai.RateLimitError)
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+                continue
+            with self._lock:
+                self.requests += 1
+                self.texts_embedded += count
+                self.request_seconds += time.perf_counter() - start
+            return result
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return self._request(lambda: self.underlying.embed_documents(texts), len(texts))
+
+    # Texts are sent in batches of `batch_size`, up to `max_concurrency` requests in flight
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return self._embed_batch(texts) if texts else []
+        vectors = []
+        for batch_vectors in self._executor.map(self._embed_batch, batches):
+            vectors.extend(batch_vectors)
+        return vectors
+
+    # Repeated queries are answered from the LRU
+    def embed_query(self, text: str) -> list[float]:
+        with self._lock:
+            vector = self._query_cache.get(text)
+            if vector is not None:
+                self._query_cache.move_to_end(text)
+                self.query_hits += 1
+                return vector
+            self.query_misses += 1
+        vector = self._request(lambda: self.underlying.embed_query(text), 1)
+        with self._lock:
+            self._query_cache[text] = vector
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+        return vector
+
+    def stats(self) -> dict:
+        lookups = self.query_hits + self.query_misses
+        return {
+            "requests": self.requests,
+            "texts_embedded": self.texts_embedded,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "request_seconds": round(self.request_seconds, 3),
+            # average over request time, the wall clock rate is higher when requests run concurrently
+            "texts_per_request_second": self.texts_embedded / self.request_seconds if self.request_seconds else 0.0,
+            "query_cache_entries": len(self._query_cache),
+            "query_cache_hits": self.query_hits,
+            "query_cache_misses": self.query_misses,
+            "query_cache_hit_rate": self.query_hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,153 @@
+import time, uuid, threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+## This File runs ingestion jobs in the background on a bounded worker pool ##
+
+# Raised inside a job when the user asked to cancel it
+class JobCancelled(Exception):
+    pass
+
+# Raised when too many jobs are already waiting for a worker
+class QueueFull(Exception):
+    pass
+
+# State and progress of a single ingestion job
+@dataclass
+class Job:
+    file_name: str
+    notebook: Optional[str] = None      # notebook the files are ingested into
+    key: Optional[str] = None           # identifies the upload, the same upload doesn't get a second job while this one runs
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"      # queued -> running -> succeeded / failed / cancelled
+    stage: str = "queued"       # what a running job is doing right now (parsing, embedding, ...)
+    pages_total: Optional[int] = None
+    pages_parsed: int = 0
+    chunks_split: int = 0
+    chunks_embedded: int = 0
+    files_total: Optional[int] = None   # bulk uploads only
+    files_done: int = 0
+    results: list = field(default_factory=list)    # bulk uploads: one result per file
+    error: Optional[str] = None
+    unchanged: bool = False     # the document was already ingested from an identical file, nothing was done
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    # Called by the worker between units of work, stops the job if it was cancelled
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "file_name": self.file_name,
+            "notebook": self.notebook,
+            "status": self.status,
+            "stage": self.stage,
+            "pages_total": self.pages_total,
+            "pages_parsed": self.pages_parsed,
+            "chunks_split": self.chunks_split,
+            "chunks_embedded": self.chunks_embedded,
+            "files_total": self.files_total,
+            "files_done": self.files_done,
+            "results": self.results,
+            "error": self.error,
+            "unchanged": self.unchanged,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+# Runs submitted jobs on `max_workers` threads, rejecting new jobs once `max_pending` are waiting
+class JobQueue:
+    def __init__(self, max_workers: int, max_pending: int, keep_finished: int = 200):
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished  # how many finished jobs stay queryable
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    # Queue `work(job)` and return the job right away
+    # `cleanup` always runs once the job is over (even if it never started).
+    # While a job with the same `key` is queued or running, that job is returned instead (and `cleanup` runs now)
+    def submit(self, file_name: str, work: Callable[[Job], bool], cleanup: Callable[[], None] = None,
+               notebook: Optional[str] = None, key: Optional[str] = None) -> Job:
+        with self._lock:
+            running = next((job for job in self._jobs.values() if key and job.key == key and not job.done), None)
+            if running is None:
+                pending = sum(1 for job in self._jobs.values() if job.status == "queued")
+                if pending >= self.max_pending:
+                    raise QueueFull(f"{pending} ingestion jobs are already waiting, try again later")
+                job = Job(file_name=file_name, notebook=notebook, key=key)
+                self._jobs[job.id] = job
+                self._prune()
+        if running:
+            if cleanup:
+                cleanup()
+            return running
+        self._executor.submit(self._run, job, work, cleanup)
+        return job
+
+    # Record a job that had nothing to do (e.g. an upload of an unchanged file), it is queryable like the others
+    def completed(self, file_name: str, notebook: Optional[str] = None, unchanged: bool = False) -> Job:
+        now = time.time()
+        job = Job(file_name=file_name, notebook=notebook, status="succeeded", stage="succeeded",
+                  unchanged=unchanged, started_at=now, finished_at=now)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def _run(self, job: Job, work, cleanup):
+        try:
+            job.check_cancelled()   # cancelled while it was still waiting
+            job.status, job.started_at = "running", time.time()
+            success = work(job)
+            job.status = "succeeded" if success else "failed"
+            if not success and job.error is None:
+                job.error = f"Failed to process {job.file_name}"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+        finally:
+            job.stage = job.status
+            job.finished_at = time.time()
+            if cleanup:
+                cleanup()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    # Newest first, only the jobs of `notebook` when given
+    def list(self, notebook: Optional[str] = None) -> list[Job]:
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if notebook is None or job.notebook == notebook]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job and not job.done:
+            job.cancel()
+            # a job that hasn't started is cancelled right away, a running one stops at its next check
+            if job.status == "queued":
+                job.status = job.stage = "cancelled"
+                job.finished_at = time.time()
+        return job
+
+    # Forget the oldest finished jobs so the registry doesn't grow forever
+    def _prune(self):
+        finished = sorted((job for job in self._jobs.values() if job.done), key=lambda job: job.finished_at)
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job.id]
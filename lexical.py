@@ -0,0 +1,139 @@
+import re, math, threading
+from collections import Counter
+import numpy as np
+
+## This File holds an in-process BM25 inverted index over the stored chunks ##
+# Vector search misses exact terms (formulas, names, course codes), BM25 catches them.
+# The index is updated as chunks are added / deleted and scored with NumPy
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self._ids = []              # chunk id of each row
+        self._sources = []          # source code of each row
+        self._source_codes = {}     # source name -> code
+        self._lengths = []          # number of tokens in each row
+        self._alive = []            # False once a row is deleted
+        self._rows = {}             # chunk id -> row
+        self._postings = {}         # term -> [[rows], [term frequencies]]
+        self._arrays = {}           # term -> (rows, tfs) as NumPy arrays, rebuilt when the postings change
+        self._dead = 0
+        self._total_length = 0
+        # NumPy copies of the per row lists, rebuilt after changes
+        self._length_array = self._alive_array = self._source_array = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._rows
+
+    # Indexed chunk ids of a source
+    def source_ids(self, source: str) -> list[str]:
+        with self._lock:
+            code = self._source_codes.get(source)
+            return [chunk_id for chunk_id, row in self._rows.items() if self._sources[row] == code]
+
+    # Index chunks (a chunk id that is already indexed is replaced)
+    def add(self, ids: list[str], texts: list[str], sources: list[str]):
+        with self._lock:
+            self._remove_locked(ids)
+            for chunk_id, text, source in zip(ids, texts, sources):
+                row = len(self._ids)
+                terms = Counter(tokenize(text))
+                self._ids.append(chunk_id)
+                self._sources.append(self._source_codes.setdefault(source, len(self._source_codes)))
+                self._lengths.append(sum(terms.values()))
+                self._alive.append(True)
+                self._rows[chunk_id] = row
+                self._total_length += self._lengths[-1]
+                for term, tf in terms.items():
+                    postings = self._postings.setdefault(term, [[], []])
+                    postings[0].append(row)
+                    postings[1].append(tf)
+                    self._arrays.pop(term, None)
+            self._length_array = self._alive_array = self._source_array = None
+
+    def remove(self, ids):
+        with self._lock:
+            self._remove_locked(ids)
+
+    def remove_source(self, source: str):
+        self.remove(self.source_ids(source))
+
+    # Rows are only flagged as deleted, the index is rebuilt once too many of them are dead
+    def _remove_locked(self, ids):
+        for chunk_id in ids:
+            row = self._rows.pop(chunk_id, None)
+            if row is not None:
+                self._alive[row] = False
+                self._dead += 1
+                self._total_length -= self._lengths[row]
+        if self._dead > 1000 and self._dead > len(self._ids) // 3:
+            self._compact()
+        self._alive_array = None
+
+    def _compact(self):
+        keep = [row for row, alive in enumerate(self._alive) if alive]
+        new_row = {old: new for new, old in enumerate(keep)}
+        postings = {}
+        for term, (rows, tfs) in self._postings.items():
+            pairs = [(new_row[row], tf) for row, tf in zip(rows, tfs) if row in new_row]
+            if pairs:
+                postings[term] = [[row for row, _ in pairs], [tf for _, tf in pairs]]
+        self._postings = postings
+        self._arrays = {}
+        self._ids = [self._ids[row] for row in keep]
+        self._sources = [self._sources[row] for row in keep]
+        self._lengths = [self._lengths[row] for row in keep]
+        self._alive = [True] * len(keep)
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._dead = 0
+        self._length_array = self._source_array = None
+
+    def _term_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            rows, tfs = self._postings[term]
+            arrays = self._arrays[term] = (np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+        return arrays
+
+    # Top `k` (chunk id, score) pairs for the query, optionally only from the given sources
+    def search(self, query: str, k: int, sources: list[str] = None) -> list[tuple[str, float]]:
+        with self._lock:
+            live = len(self._rows)
+            if not live:
+                return []
+            if self._length_array is None:
+                self._length_array = np.asarray(self._lengths, dtype=np.float32)
+                self._source_array = np.asarray(self._sources, dtype=np.int32)
+            if self._alive_array is None:
+                self._alive_array = np.asarray(self._alive, dtype=bool)
+            average_length = self._total_length / live or 1.0
+            # per row length normalisation shared by every query term
+            norm = self.k1 * (1 - self.b + self.b * self._length_array / average_length)
+            scores = np.zeros(len(self._ids), dtype=np.float32)
+            for term in set(tokenize(query)):
+                if term not in self._postings:
+                    continue
+                rows, tfs = self._term_arrays(term)
+                document_frequency = int(self._alive_array[rows].sum())
+                if not document_frequency:
+                    continue
+                idf = math.log(1 + (live - document_frequency + 0.5) / (document_frequency + 0.5))
+                scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm[rows])
+            mask = self._alive_array & (scores > 0)
+            if sources is not None:
+                codes = [self._source_codes[source] for source in sources if source in self._source_codes]
+                mask &= np.isin(self._source_array, codes)
+            candidates = np.flatnonzero(mask)
+            if not len(candidates):
+                return []
+            top = candidates[np.argsort(-scores[candidates])[:k]]
+            return [(self._ids[row], float(scores[row])) for row in top]
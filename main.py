@@ -1,107 +1,666 @@
 import os
-from db import get_db,delete_db
-from datetime import datetime,timedelta
+from db import get_db,delete_db,get_embeddings,get_embedding_client,check_notebook
+from metrics import span, timed_iter, observe_stage, thread_stage_seconds, LLMMetricsCallback, render as render_metrics
+from config import (INGEST_BATCH_SIZE, INGEST_PARSE_WORKERS, CATALOG_PATH, DEFAULT_NOTEBOOK, NOTEBOOKS_DIRECTORY, LOCK_DIRECTORY,
+                    FLASHCARD_COUNT, FLASHCARD_CACHE_MAX_ENTRIES, RETRIEVAL_K, RETRIEVAL_MODE, RETRIEVAL_CANDIDATES,
+                    RETRIEVAL_MMR, MMR_LAMBDA, RRF_K, RETRIEVAL_NEIGHBOURS, LOG_CONTENT,
+                    SESSIONS_PATH, CHAT_HISTORY_TOKEN_BUDGET, CHAT_SESSION_MAX_AGE,
+                    SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_MAX_ENTRIES,
+                    SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_CACHE_TTL, SUMMARY_MAP_CACHE_MAX_ENTRIES,
+                    SUMMARY_MAP_TOKEN_BUDGET, SUMMARY_REDUCE_TOKEN_BUDGET, SUMMARY_MAX_CONCURRENCY, SUMMARY_MAP_ANCHOR_EVERY)
+from jobs import JobCancelled
+from catalog import Catalog
+from cache import make_cache
+from singleflight import SingleFlight, process_lock
+from semantic_cache import SemanticCache
+from sessions import SessionStore
+from tokens import count_tokens
+from lexical import BM25Index
+from backends import create_chat_model, model_name_of
+from retrieval import reciprocal_rank_fusion, mmr_select
+from cards import CardStreamParser, FLASHCARD_RESPONSE_FORMAT
+from collections import Counter
+import hashlib, asyncio, logging, threading, time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader, PyPDFLoader
 from langchain_chroma import Chroma
-from langchain.chains.summarize import load_summarize_chain
-import json,re
+from summarizer import summarize_texts
+from parsing import load_pages, page_number, is_pdf, count_pages, split_file, source_name
+from chunking import ChunkingOptions, make_chunker
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
 
 ## This file handles the backend logic ##
+logger = logging.getLogger(__name__)
 
-# In-memory cache for storing recently generated content
-summary_cache = {}
-SUMMARY_TTL = timedelta(minutes=60)
+# BM25 index of each notebook over its stored chunks for hybrid retrieval (kept up to date by process_file / delete_source,
+# and by the catalog's change log for documents other worker processes changed)
+lexical_indexes: dict[str, BM25Index] = {}   # notebook -> index, present once loaded
+_lexical_generations: dict[str, int] = {}    # notebook -> catalog generation the index has caught up with
+_lexical_lock = threading.Lock()
+
+# Opt-in cache of chat answers for semantically similar questions over the same chunks
+answer_cache = (
+    SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_MAX_ENTRIES)
+    if SEMANTIC_CACHE_ENABLED else None
+)
+
+# Coalesce concurrent summary / flashcard requests for the same file version
+summary_flight = SingleFlight(os.path.join(LOCK_DIRECTORY, "summaries"))
+flashcard_flight = SingleFlight(os.path.join(LOCK_DIRECTORY, "flashcards"))
 
 load_dotenv()
 
 ## This File handles the backend logic called by the API Routes ## 
+# Every document function takes the notebook it works in (see DEFAULT_NOTEBOOK):
+# each notebook has its own collection, catalog and lexical index
+
+# The chat model, the vector store, the catalog, the caches and the session store are created on first use (see warm_up)
+_model = None
+_catalogs: dict[str, Catalog] = {}   # notebook -> catalog
+_caches: dict = {}                   # cache name -> cache
+_chat_sessions = None
+_init_lock = threading.Lock()
+
+def _get_cache(name: str, max_entries: int, ttl: float = None):
+    cache = _caches.get(name)
+    if cache is None:
+        with _init_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                cache = _caches[name] = make_cache(name, max_entries, ttl)
+    return cache
+
+# Cache for generated summaries, keyed on the source and the hash of its chunk contents
+def get_summary_cache():
+    return _get_cache("summaries", SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_CACHE_TTL)
+
+# Cache for the map step outputs, keyed on the content of each batch of chunks
+def get_summary_map_cache():
+    return _get_cache("summary_map", SUMMARY_MAP_CACHE_MAX_ENTRIES, SUMMARY_CACHE_TTL)
+
+# Generated flashcard decks, keyed on the source and the summary they were generated from
+def get_flashcard_cache():
+    return _get_cache("flashcards", FLASHCARD_CACHE_MAX_ENTRIES)
+
+# Server-side chat sessions
+def get_chat_sessions() -> SessionStore:
+    global _chat_sessions
+    if _chat_sessions is None:
+        with _init_lock:
+            if _chat_sessions is None:
+                _chat_sessions = SessionStore(SESSIONS_PATH)
+    return _chat_sessions
+
+# Chat model from the configured backend ("openai" or the offline "stub")
+def get_model():
+    global _model
+    if _model is None:
+        with _init_lock:
+            if _model is None:
+                model = create_chat_model()
+                # times every call and counts its tokens for /metrics
+                model.callbacks = list(model.callbacks or []) + [LLMMetricsCallback(model_name_of(model))]
+                _model = model
+    return _model
+
+# Position of a chunk stored under the old "<source>-<index>" ids
+def _legacy_position(chunk_id: str) -> int:
+    suffix = chunk_id.rsplit("-", 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+# Stores created before the catalog existed are listed once from their chunk metadata,
+# and every chunk they hold is marked live
+def _backfill_catalog(catalog: Catalog, notebook: str = DEFAULT_NOTEBOOK):
+    results = get_db(notebook).get(include=["metadatas"])
+    chunk_ids = {}
+    for chunk_id, metadata in zip(results["ids"], results["metadatas"]):
+        if metadata:
+            chunk_ids.setdefault(metadata.get("source"), []).append(chunk_id)
+    for ids in chunk_ids.values():
+        ids.sort(key=_legacy_position)
+    if not catalog.is_backfilled():
+        catalog.backfill(Counter({source: len(ids) for source, ids in chunk_ids.items()}))
+    catalog.backfill_chunks(chunk_ids)
+    logger.info("catalog backfilled notebook=%s documents=%d", notebook, len(chunk_ids))
+
+def _catalog_path(notebook: str) -> str:
+    return CATALOG_PATH if notebook == DEFAULT_NOTEBOOK else os.path.join(NOTEBOOKS_DIRECTORY, f"{notebook}.sqlite3")
+
+# Catalog of the documents uploaded to a notebook, kept up to date by process_file and delete_source
+def get_catalog(notebook: str = DEFAULT_NOTEBOOK) -> Catalog:
+    catalog = _catalogs.get(notebook)
+    if catalog is None:
+        with _init_lock:
+            catalog = _catalogs.get(notebook)
+            if catalog is None:
+                catalog = Catalog(_catalog_path(check_notebook(notebook)))
+                if not catalog.is_backfilled() or not catalog.is_chunks_backfilled():
+                    _backfill_catalog(catalog, notebook)
+                _catalogs[notebook] = catalog
+    return catalog
+
+# Warm-up state reported by the readiness probe
+_readiness = {"ready": False, "error": None, "warmup_seconds": None}
+
+# Create everything a request needs up front (model client, store, catalog, caches, sessions, lexical index)
+# so the first requests don't pay for it. Run by the API at startup
+def warm_up():
+    start = time.perf_counter()
+    try:
+        get_model()
+        get_db().get(limit=1, include=[])   # opens the collection
+        get_catalog()
+        get_summary_cache()
+        get_summary_map_cache()
+        get_flashcard_cache()
+        get_chat_sessions()
+        if RETRIEVAL_MODE == "hybrid":
+            _get_lexical_index()
+    except Exception as e:
+        _readiness["error"] = f"{type(e).__name__}: {e}"
+        raise
+    _readiness.update(ready=True, error=None, warmup_seconds=round(time.perf_counter() - start, 3))
+    logger.info("warm-up finished seconds=%s", _readiness["warmup_seconds"])
+
+# Without warm-up workers are ready right away and create things lazily on the first requests
+def get_readiness(warmup_enabled: bool = True) -> dict:
+    return dict(_readiness, ready=_readiness["ready"] or not warmup_enabled)
+
+# Returns list of files that the user uploaded (one page of them when offset/limit are given)
+def get_all_sources(offset: int = 0, limit: int = None, notebook: str = DEFAULT_NOTEBOOK) -> list[str]:
+    return [document["source"] for document in get_catalog(notebook).list(offset, limit)]
+
+# Identifies an upload: the bytes of the file and the chunking settings it is split with
+def file_fingerprint(file_path: str, chunking: ChunkingOptions = None) -> str:
+    options = chunking or ChunkingOptions()
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return f"{digest.hexdigest()}:{options.chunker}:{options.chunk_tokens}:{options.overlap_tokens}"
+
+# Catalog entry of the document when it was last ingested from an identical upload, else None
+def find_unchanged(file_name: str, fingerprint: str, notebook: str = DEFAULT_NOTEBOOK) -> dict:
+    document = get_catalog(notebook).get(file_name)
+    return document if document and document.get("file_hash") == fingerprint else None
+
+# Returns catalog entries (chunk count, byte size, page count, upload time) for uploaded files
+def get_documents(offset: int = 0, limit: int = None, notebook: str = DEFAULT_NOTEBOOK) -> list[dict]:
+    return get_catalog(notebook).list(offset, limit)
+
+def count_sources(notebook: str = DEFAULT_NOTEBOOK) -> int:
+    return get_catalog(notebook).count()
+
+# Returns hit / miss counts for the persistent caches
+def get_cache_stats() -> dict:
+    return {
+        "embeddings": get_embeddings().stats(),
+        "embedding_client": get_embedding_client().stats(),
+        "summaries": get_summary_cache().stats(),
+        "summary_map": get_summary_map_cache().stats(),
+        "flashcards": get_flashcard_cache().stats(),
+        "answers": answer_cache.stats() if answer_cache is not None else None,
+    }
 
-model = ChatOpenAI(model="gpt-4o")
+# Prometheus text for /metrics: stage timings, LLM calls / tokens and the cache counters as gauges
+def get_metrics_text(extra_gauges: dict = None) -> str:
+    cache_values = {}
+    for cache, stats in get_cache_stats().items():
+        for stat, value in (stats or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                cache_values[(cache, stat)] = value
+    gauges = {"clarity_cache": ("Cache counters (see /cache/stats)", ("cache", "stat"), cache_values)}
+    gauges.update(extra_gauges or {})
+    return render_metrics(gauges)
 
-# VectorDB obj
-vector_db = get_db()
+def _chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-# Returns list of files that the user uploaded
-def get_all_sources() -> list[str]:
-    # get all documents in vector database and their metadatas
-    all_docs = vector_db.get()
-    metadatas = all_docs.get("metadatas",[])
-    # create list of 'source' values from the metadats
-    files = [metadata.get("source") for metadata in metadatas if metadata]
-    # return unique file names to user
-    unique_files = list(set(files))
-    print("Uploaded files:", unique_files)
-    return unique_files
+# Order independent hash of a document's chunk contents, changes whenever a chunk is added, removed or edited
+def _content_version(chunk_hashes) -> str:
+    return hashlib.sha256("\n".join(sorted(chunk_hashes)).encode("utf-8")).hexdigest()
+
+# Content version of an uploaded file (computed from its chunks if the catalog doesn't have it yet)
+def get_content_version(file_name: str, notebook: str = DEFAULT_NOTEBOOK):
+    entry = get_catalog(notebook).get(file_name)
+    if entry and entry["content_hash"]:
+        return entry["content_hash"]
+    chunk_ids = get_catalog(notebook).chunk_ids(file_name)
+    if not chunk_ids:
+        return None
+    texts = get_db(notebook).get(ids=chunk_ids, include=["documents"])["documents"]
+    version = _content_version(_chunk_hash(text) for text in texts)
+    if entry:
+        get_catalog(notebook).set_content_hash(file_name, version)
+    return version
 
 # Deletes all document chunks for the vector database that match the given file name
-def delete_source(file_name : str) -> bool:
+def delete_source(file_name : str, notebook: str = DEFAULT_NOTEBOOK) -> bool:
     try: 
-        # Delete based on 'source' meatada
-        vector_db.delete(where={"source": file_name})
-        print(f"Deleted documents from file: {file_name}")
+        # Drop generated content for the current version
+        version = get_content_version(file_name, notebook)
+        if version:
+            summary = get_summary_cache().get(f"{file_name}:{version}")
+            if summary is not None:
+                get_flashcard_cache().delete(_deck_key(file_name, summary))
+            get_summary_cache().delete(f"{file_name}:{version}")
+        # Forget cached answers that were built from these chunks
+        if answer_cache is not None:
+            answer_cache.invalidate_chunks(get_catalog(notebook).chunk_ids(file_name))
+        # Unpublish first so readers stop seeing the document, then delete based on 'source' meatada
+        with _source_lock(notebook, file_name):
+            get_catalog(notebook).delete(file_name)
+            get_db(notebook).delete(where={"source": file_name})
+            _update_lexical_index(lambda index: index.remove_source(file_name), notebook)
+        logger.info("deleted notebook=%s source=%s", notebook, file_name)
         return True
     except Exception as e:
-        print(f"Error deleting documents for {file_name}: {e}")
+        logger.exception("delete failed notebook=%s source=%s", notebook, file_name)
         return False
 
 # Chunk File and embedd content  
-def process_file(file_path,file_name):
-    # Intialize Loader based on file type
-    extension = os.path.splitext(file_path)[1].lower()
-    if extension =='.txt':
-        loader = TextLoader(file_path=file_path)
-    elif extension =='.pdf':
-        loader = PyPDFLoader(file_path=file_path)
-        
-    # Define chunking parameters
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000, 
-        chunk_overlap=50,   # Define Chunk size and overlap 
-        separators=["\n\n","\n", ".", " ",""])  # Define seperators to split text in order of preference
+# Pages are split as they are read and chunks are embedded/stored in fixed size batches,
+# so peak memory depends on the batch size and not on the size of the document.
+# Re-uploads only embed the chunks that changed and switch to the new version at the end (see _publish).
+# `chunking` overrides the configured chunker / chunk size for this file.
+# A file identical to the one the document was last ingested from (same fingerprint) is not ingested again.
+# When run as a background job, progress is reported on `job` and cancellation is checked between batches
+def process_file(file_path,file_name,job=None,chunking: ChunkingOptions = None,notebook: str = DEFAULT_NOTEBOOK,
+                 fingerprint: str = None):
     try:
-        documents = loader.load()
-        # Split document into chunks and add 'source' and 'id' metadata to each chunk
-        docs = []
-        for i, chunk in enumerate(text_splitter.split_documents(documents)):
-            docs.append(Document(
-                page_content = chunk.page_content,
-                metadata={"source":file_name}, # Add Metadata
-                id=f"{file_path}-{i}" # prevent adding duplicate chunks    
-                )
+        chunker = make_chunker(chunking)
+        fingerprint = fingerprint or file_fingerprint(file_path, chunking)
+        embedding_cache = get_embeddings().cache
+        hits, misses = embedding_cache.hits, embedding_cache.misses
+        if job:
+            job.pages_total = count_pages(file_path)
+        page_count = 0
+        
+        # Split pages into chunks as they are read
+        def document_chunks():
+            nonlocal page_count
+            for page in timed_iter(load_pages(file_path), "load"):
+                page_count += 1
+                if job:
+                    job.check_cancelled()
+                    job.stage = "parsing"
+                    job.pages_parsed += 1
+                with span("split"):
+                    chunks = chunker.feed(page.page_content, page_number(page))
+                yield from chunks
+            with span("split"):
+                chunks = chunker.finish()
+            yield from chunks
+        
+        with _source_lock(notebook, file_name):
+            if find_unchanged(file_name, fingerprint, notebook):
+                logger.info("unchanged notebook=%s source=%s", notebook, file_name)
+                if job:
+                    job.unchanged = True
+                return True
+            chunk_ids, positions, added, content_hash = _store_chunks(file_name, document_chunks(), job, notebook)
+            if not chunk_ids:
+                logger.warning("no text found source=%s", file_name)
+                return False
+                     
+            # Switch the document over to the new version
+            _publish(
+                file_name, chunk_ids, positions, added,
+                byte_size = os.path.getsize(file_path),
+                page_count = page_count if is_pdf(file_path) else None,  # text files are read in blocks, not pages
+                content_hash = content_hash,
+                file_hash = fingerprint,
+                notebook = notebook
             )
-                 
-        # Display information about the split documents
-        print("\n--- Document Chunks Information ---\n")
-        print(f"Number of document chunks: {len(docs)}")
-        print(f"Sample chunk:\n{docs[0].page_content}\n")
-            
-        # Add new documents to exisiting vector store
-        vector_db.add_documents(docs)    
+        logger.info("embedding cache source=%s hits=%d misses=%d", file_name,
+                    embedding_cache.hits - hits, embedding_cache.misses - misses)
         return True 
     
+    except JobCancelled:
+        # _store_chunks already removed the new chunks, the previous version (if any) stays live
+        logger.info("ingestion cancelled source=%s", file_name)
+        raise
     except Exception as e:
-        print(f"Error processing document: {e}")
+        logger.exception("ingestion failed source=%s", file_name)
+        if job:
+            job.error = str(e)
         return False
 
-# Answer questions based on notes and returns relevant chunks
-def answer_question_based_on_notes(query: str, chat_history: list) -> dict:
-    # Setup Vector Store Retriever to retrieve relevant docs based on query
-    retriever = vector_db.as_retriever(
-        search_type = 'similarity', # return chunks based on semantic similarity
-        search_kwargs = {"k":3} # specify how many chunks to return
+# One ingestion (or deletion) of a given source at a time, so two uploads of the same file can't publish
+# over each other. Threads wait on a lock of this process, worker processes on a file lock
+_source_locks = {}
+_source_locks_lock = threading.Lock()
+
+@contextmanager
+def _source_lock(notebook: str, file_name: str):
+    with _source_locks_lock:
+        lock = _source_locks.setdefault((notebook, file_name), threading.Lock())
+    with lock, process_lock(os.path.join(LOCK_DIRECTORY, "sources"), f"{notebook}/{file_name}"):
+        yield
+
+# Chunk ids are derived from the chunk text, so an unchanged chunk keeps its id across versions
+# (repeated texts within a file get a counter)
+def _chunk_id(file_name: str, chunk_hash: str, occurrence: int) -> str:
+    chunk_id = f"{file_name}-{chunk_hash[:16]}"
+    return f"{chunk_id}-{occurrence}" if occurrence else chunk_id
+
+# Embed and store the chunks of a file in INGEST_BATCH_SIZE batches
+# Chunks the live version already has are not embedded or written again.
+# The new chunks stay invisible to readers until _publish, and are removed again if ingestion fails.
+# Returns the chunk ids in document order, their (page, start, end, section), the ids that were added
+# and the content version of the file
+def _store_chunks(file_name: str, chunks, job=None, notebook: str = DEFAULT_NOTEBOOK):
+    live_ids = set(get_catalog(notebook).chunk_ids(file_name))
+    batch = []
+    chunk_ids, positions, added = [], [], []
+    chunk_hashes = []
+    occurrences = Counter()
+    try:
+        for chunk in chunks:
+            text = chunk.text
+            if not chunk_ids and LOG_CONTENT:
+                logger.debug("sample chunk source=%s text=%r", file_name, text)
+            chunk_hash = _chunk_hash(text)
+            chunk_id = _chunk_id(file_name, chunk_hash, occurrences[chunk_hash])
+            occurrences[chunk_hash] += 1
+            chunk_ids.append(chunk_id)
+            positions.append((chunk.page, chunk.start, chunk.end, chunk.section))
+            chunk_hashes.append(chunk_hash)
+            if job:
+                job.chunks_split += 1
+            if chunk_id in live_ids:
+                continue
+            # Add 'source' and 'id' metadata to each chunk
+            batch.append(Document(
+                page_content = text,
+                metadata={"source":file_name}, # Add Metadata
+                id=chunk_id
+                )
+            )
+            # Add full batches to exisiting vector store as soon as they are ready
+            if len(batch) >= INGEST_BATCH_SIZE:
+                _add_batch(batch, job, notebook)
+                added.extend(doc.id for doc in batch)
+                batch = []
+        if batch:
+            _add_batch(batch, job, notebook)
+            added.extend(doc.id for doc in batch)
+    except BaseException:
+        _discard_chunks(added, notebook)
+        raise
+    return chunk_ids, positions, added, _content_version(chunk_hashes)
+
+# Remove chunks that never went live (or no longer are) from the store and the lexical index
+def _discard_chunks(chunk_ids: list[str], notebook: str = DEFAULT_NOTEBOOK):
+    if not chunk_ids:
+        return
+    try:
+        get_db(notebook).delete(ids=chunk_ids)
+        _update_lexical_index(lambda index: index.remove(chunk_ids), notebook)
+    except Exception:
+        logger.exception("could not remove chunks=%d", len(chunk_ids))
+
+# Make the stored chunks the live version of the document in one catalog transaction,
+# then delete the chunks only the replaced version used
+def _publish(file_name: str, chunk_ids: list[str], positions: list[tuple], added: list[str], byte_size: int = None,
+             page_count: int = None, content_hash: str = None, file_hash: str = None, notebook: str = DEFAULT_NOTEBOOK):
+    old_ids = get_catalog(notebook).replace_document(
+        file_name, chunk_ids, byte_size=byte_size, page_count=page_count, content_hash=content_hash, positions=positions,
+        file_hash=file_hash
     )
-    relevant_docs = retriever.invoke(query)
+    orphans = list(set(old_ids) - set(chunk_ids))
+    # answers built from removed chunks are stale
+    if answer_cache is not None and orphans:
+        answer_cache.invalidate_chunks(orphans)
+    _discard_chunks(orphans, notebook)
+    logger.info("ingested notebook=%s source=%s chunks=%d added=%d reused=%d removed=%d",
+                notebook, file_name, len(chunk_ids), len(added), len(chunk_ids) - len(added), len(orphans))
+
+# Parsing pool for bulk uploads, separate processes so pdf parsing isn't limited to one core
+_parse_pool = None
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        with _init_lock:
+            if _parse_pool is None:
+                # spawn: the workers only import parsing.py, not this module's clients and threads
+                _parse_pool = ProcessPoolExecutor(max_workers=INGEST_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _parse_pool
+
+# Ingest many files at once: [(file path, uploaded name)], each stored as the document source_name(uploaded name)
+# Files are parsed and split in the process pool while the parsed ones are embedded and stored here,
+# so parsing and embedding overlap. Returns one result per file (also kept up to date on `job.results`).
+# When several files map to the same document (a/notes.txt and b/notes.pdf) the first one is ingested
+# and the others fail
+def process_files(files: list[tuple[str, str]], job=None, chunking: ChunkingOptions = None,
+                  notebook: str = DEFAULT_NOTEBOOK) -> list[dict]:
+    results, uploaded_names, duplicates, unique = {}, {}, [], []
+    for file_path, uploaded_name in files:
+        file_name = source_name(uploaded_name)
+        result = {"file_name": file_name, "status": "queued", "chunks": 0, "pages": None, "error": None, "unchanged": False}
+        if file_name in results:
+            result.update(status="failed", error=f"Skipped {uploaded_name}: {uploaded_names[file_name]} is also "
+                                                 f"named '{file_name}' and is ingested instead")
+            duplicates.append(result)
+        else:
+            results[file_name], uploaded_names[file_name] = result, uploaded_name
+            unique.append((file_path, file_name))
+    files = unique
+    if job:
+        job.files_total = len(results) + len(duplicates)
+        job.files_done = len(duplicates)
+        job.results = list(results.values()) + duplicates
+        job.stage = "parsing"
+    # files identical to the ones their documents were last ingested from are skipped without being parsed
+    fingerprints = {file_name: file_fingerprint(file_path, chunking) for file_path, file_name in files}
+    to_parse = []
+    for file_path, file_name in files:
+        document = find_unchanged(file_name, fingerprints[file_name], notebook)
+        if document:
+            results[file_name].update(status="succeeded", chunks=document["chunk_count"], pages=document["page_count"],
+                                      unchanged=True)
+            if job:
+                job.files_done += 1
+        else:
+            to_parse.append((file_path, file_name))
+    futures = {_get_parse_pool().submit(split_file, file_path, chunking): (file_path, file_name) for file_path, file_name in to_parse}
+    try:
+        for future in as_completed(futures):
+            file_path, file_name = futures[future]
+            result = results[file_name]
+            if job:
+                job.check_cancelled()
+            try:
+                parsed = future.result()
+                observe_stage("load", parsed["load_seconds"])
+                observe_stage("split", parsed["split_seconds"])
+                result["pages"] = parsed["page_count"]
+                if job:
+                    job.stage = "embedding"
+                    job.pages_parsed += parsed["page_count"] or 0
+                if not parsed["chunks"]:
+                    raise ValueError("No text found")
+                with _source_lock(notebook, file_name):
+                    chunk_ids, positions, added, content_hash = _store_chunks(file_name, parsed["chunks"], job, notebook)
+                    _publish(
+                        file_name, chunk_ids, positions, added,
+                        byte_size = os.path.getsize(file_path),
+                        page_count = parsed["page_count"],
+                        content_hash = content_hash,
+                        file_hash = fingerprints[file_name],
+                        notebook = notebook
+                    )
+                result.update(status="succeeded", chunks=len(chunk_ids))
+            except JobCancelled:
+                raise
+            except Exception as e:
+                logger.exception("ingestion failed source=%s", file_name)
+                result.update(status="failed", error=str(e))
+            if job:
+                job.files_done += 1
+    except JobCancelled:
+        for future in futures:
+            future.cancel()
+        for result in results.values():
+            if result["status"] == "queued":
+                result["status"] = "cancelled"
+        raise
+    return list(results.values()) + duplicates
+
+# Embed and store one batch of chunks
+def _add_batch(batch, job=None, notebook: str = DEFAULT_NOTEBOOK):
+    if job:
+        job.check_cancelled()
+        job.stage = "embedding"
+    # add_documents embeds and then upserts, the embed span is taken out of the upsert time
+    start, embedded = time.perf_counter(), thread_stage_seconds("embed")
+    get_db(notebook).add_documents(batch)
+    observe_stage("upsert", time.perf_counter() - start - (thread_stage_seconds("embed") - embedded))
+    _update_lexical_index(lambda index: index.add(
+        [doc.id for doc in batch], [doc.page_content for doc in batch], [doc.metadata["source"] for doc in batch]
+    ), notebook)
+    if job:
+        job.chunks_embedded += len(batch)
+
+# Loads a notebook's lexical index from its collection the first time it is needed,
+# afterwards re-reads the documents other workers changed since
+def _get_lexical_index(notebook: str = DEFAULT_NOTEBOOK) -> BM25Index:
+    index = lexical_indexes.get(notebook)
+    if index is None:
+        with _lexical_lock:
+            index = lexical_indexes.get(notebook)
+            if index is None:
+                # changes made while loading are applied again on the next call (re-reading a document is idempotent)
+                _lexical_generations[notebook] = get_catalog(notebook).generation()
+                index = BM25Index()
+                offset = 0
+                while True:
+                    page = get_db(notebook).get(include=["documents", "metadatas"], limit=5000, offset=offset)
+                    if not page["ids"]:
+                        break
+                    index.add(page["ids"], page["documents"], [(meta or {}).get("source") for meta in page["metadatas"]])
+                    offset += len(page["ids"])
+                lexical_indexes[notebook] = index
+                logger.info("lexical index loaded notebook=%s chunks=%d", notebook, len(index))
+                return index
+    generation, sources = get_catalog(notebook).changes_since(_lexical_generations[notebook])
+    if generation != _lexical_generations[notebook]:
+        with _lexical_lock:
+            generation, sources = get_catalog(notebook).changes_since(_lexical_generations[notebook])
+            if sources is None:
+                # further behind than the change log goes back: load the index again
+                lexical_indexes.pop(notebook, None)
+                sources = []
+            for source in sources:
+                live = get_catalog(notebook).chunk_ids(source)
+                # chunks of the replaced / deleted version go, unless this process is ingesting the source
+                # right now (they may be its new chunks, readers only see live chunks anyway)
+                lock = _source_locks.get((notebook, source))
+                if not (lock and lock.locked()):
+                    live_ids = set(live)
+                    index.remove([chunk_id for chunk_id in index.source_ids(source) if chunk_id not in live_ids])
+                missing = [chunk_id for chunk_id in live if chunk_id not in index]
+                if missing:
+                    results = get_db(notebook).get(ids=missing, include=["documents"])
+                    index.add(results["ids"], results["documents"], [source] * len(results["ids"]))
+            _lexical_generations[notebook] = generation
+            if sources:
+                logger.info("lexical index caught up notebook=%s documents=%d", notebook, len(sources))
+        if notebook not in lexical_indexes:
+            logger.info("lexical index missed pruned catalog changes, reloading notebook=%s", notebook)
+            return _get_lexical_index(notebook)
+    return index
+
+# Apply a change to a notebook's lexical index (skipped until it is loaded, loading picks the change up from the store)
+def _update_lexical_index(update, notebook: str = DEFAULT_NOTEBOOK):
+    with _lexical_lock:
+        index = lexical_indexes.get(notebook)
+        if index is not None:
+            update(index)
+
+# Vector Store Retriever to retrieve relevant docs based on query
+# Hybrid mode fuses the semantic similarity ranking with the BM25 ranking (reciprocal rank fusion),
+# optionally diversifies the result with MMR, and can be limited to some sources.
+# Only chunks of published document versions are returned (a re-upload in progress stays invisible),
+# with their page / offsets / section in the metadata and optionally the chunks around them
+def _search(query: str, query_vector, sources: list[str] = None, notebook: str = DEFAULT_NOTEBOOK) -> list[Document]:
+    where = {"source": {"$in": sources}} if sources else None
+    vector_docs = get_db(notebook).similarity_search_by_vector(query_vector, k=RETRIEVAL_CANDIDATES, filter=where)
+    docs_by_id = {doc.id: doc for doc in vector_docs}
+    rankings = [[doc.id for doc in vector_docs]]
+    if RETRIEVAL_MODE == "hybrid":
+        rankings.append([chunk_id for chunk_id, _ in _get_lexical_index(notebook).search(query, RETRIEVAL_CANDIDATES, sources)])
+    ranked_ids = reciprocal_rank_fusion(rankings, RRF_K)
+    locations = get_catalog(notebook).live_chunks(ranked_ids)
+    ranked_ids = [chunk_id for chunk_id in ranked_ids if chunk_id in locations]
+    pool = ranked_ids[:RETRIEVAL_CANDIDATES] if RETRIEVAL_MMR else ranked_ids[:RETRIEVAL_K]
     
-    # Display relevant results with the metadata
-    print("\n-- Relevant Documents --")
-    for i, doc in enumerate(relevant_docs,1):
-        print(f"Document {i}, {doc.page_content}")
+    # fetch the chunks only the lexical search found (and the vectors MMR needs)
+    missing = [chunk_id for chunk_id in pool if chunk_id not in docs_by_id]
+    if missing or RETRIEVAL_MMR:
+        include = ["documents", "metadatas"] + (["embeddings"] if RETRIEVAL_MMR else [])
+        results = get_db(notebook).get(ids=pool if RETRIEVAL_MMR else missing, include=include)
+        for i, chunk_id in enumerate(results["ids"]):
+            docs_by_id.setdefault(chunk_id, Document(id=chunk_id, page_content=results["documents"][i], metadata=results["metadatas"][i] or {}))
+        if RETRIEVAL_MMR:
+            vectors = dict(zip(results["ids"], results["embeddings"]))
+            pool = [chunk_id for chunk_id in pool if chunk_id in vectors]
+            selected = mmr_select(query_vector, [vectors[chunk_id] for chunk_id in pool], RETRIEVAL_K, MMR_LAMBDA)
+            pool = [pool[i] for i in selected]
+    docs = [docs_by_id[chunk_id] for chunk_id in pool[:RETRIEVAL_K] if chunk_id in docs_by_id]
+    for doc in docs:
+        doc.metadata = {**doc.metadata, **locations[doc.id]}
+    return _with_neighbours(docs, notebook) if RETRIEVAL_NEIGHBOURS else docs
+
+# Adds the RETRIEVAL_NEIGHBOURS chunks before and after each retrieved chunk, looked up by position in the
+# catalog instead of searching again. Each hit is followed by its window in document order, without repeats
+def _with_neighbours(docs: list[Document], notebook: str = DEFAULT_NOTEBOOK) -> list[Document]:
+    docs_by_id = {doc.id: doc for doc in docs}
+    ordered = []
+    for doc in docs:
+        window = get_catalog(notebook).chunk_range(doc.metadata["source"], doc.metadata["position"] - RETRIEVAL_NEIGHBOURS,
+                                           doc.metadata["position"] + RETRIEVAL_NEIGHBOURS)
+        ordered.extend(chunk_id for chunk_id in window if chunk_id not in ordered)
+    missing = [chunk_id for chunk_id in ordered if chunk_id not in docs_by_id]
+    if missing:
+        results = get_db(notebook).get(ids=missing, include=["documents", "metadatas"])
+        locations = get_catalog(notebook).live_chunks(results["ids"])
+        for i, chunk_id in enumerate(results["ids"]):
+            if chunk_id in locations:
+                docs_by_id[chunk_id] = Document(id=chunk_id, page_content=results["documents"][i],
+                                                metadata={**(results["metadatas"][i] or {}), **locations[chunk_id]})
+    return [docs_by_id[chunk_id] for chunk_id in ordered if chunk_id in docs_by_id]
+
+# The query is embedded once and reused for the search and the semantic answer cache
+def _retrieve(query: str, sources: list[str] = None, notebook: str = DEFAULT_NOTEBOOK):
+    with span("retrieve"):
+        query_vector = get_embeddings().embed_query(query)
+        return query_vector, _search(query, query_vector, sources, notebook)
+
+async def _aretrieve(query: str, sources: list[str] = None, notebook: str = DEFAULT_NOTEBOOK):
+    with span("retrieve"):
+        query_vector = await get_embeddings().aembed_query(query)
+        return query_vector, await asyncio.to_thread(_search, query, query_vector, sources, notebook)
+
+def _lookup_answer(query_vector, chunk_ids: list[str]):
+    with span("cache_lookup"):
+        return answer_cache.lookup(query_vector, chunk_ids)
+
+# Cached answers only apply to a fresh question (no chat history) when the cache is enabled
+def _use_answer_cache(chat_history: list, history_summary: str = "") -> bool:
+    return answer_cache is not None and not chat_history and not history_summary
+
+# Build the LLM input from the retrieved chunks, the chat history and the query
+# `history_summary` is the running summary of older turns of a server-side session
+def _build_messages(query: str, chat_history: list, relevant_docs: list, history_summary: str = "") -> list:
+    # Log the relevant chunks (only with CLARITY_LOG_CONTENT, they can be large and private)
+    if LOG_CONTENT:
+        for i, doc in enumerate(relevant_docs,1):
+            logger.debug("relevant document %d id=%s text=%r", i, doc.id, doc.page_content)
         
     # Construct input for LLM
     sources = [doc.page_content for doc in relevant_docs]
@@ -110,6 +669,8 @@ def answer_question_based_on_notes(query: str, chat_history: list) -> dict:
     
     # Build the chat history
     messages = [system_msg]
+    if history_summary:
+        messages.append(SystemMessage(content=f"Summary of the earlier part of this conversation:\n{history_summary}"))
     for turn in chat_history:
         if turn["role"] == "user":
             messages.append(HumanMessage(content=turn["content"]))
@@ -122,145 +683,257 @@ def answer_question_based_on_notes(query: str, chat_history: list) -> dict:
         \n\nRelevant documents:\n{context}\n\n Answer the question primarily using the information in the provided documents. 
         You may reason and reference earlier parts of this conversation if helpful.'"""
     ))
-    
-    # Query LLM w/ chat history 
-    response = model.invoke(messages)
-    
-    print("\n--- Generated Response ---")
-    print(response.content)
+    return messages
+
+## Chat Sessions ##
+# The server keeps each session's history. Once the turns no longer fit in CHAT_HISTORY_TOKEN_BUDGET
+# the oldest ones are folded into a running summary, so the prompt size stays flat however long the chat gets
+
+def create_chat_session() -> str:
+    get_chat_sessions().expire(CHAT_SESSION_MAX_AGE)
+    return get_chat_sessions().create()
+
+def get_chat_session(session_id: str) -> dict:
+    session = get_chat_sessions().get(session_id)
+    if session is None:
+        raise KeyError(f"Chat session {session_id} not found")
+    return session
+
+def delete_chat_session(session_id: str) -> bool:
+    return get_chat_sessions().delete(session_id)
+
+def _history_tokens(turns: list) -> int:
+    return sum(count_tokens(turn["content"]) for turn in turns)
+
+# Adds the new turn to the session. Returns the turns to keep and, when the history went over budget,
+# the oldest turns that should be folded into the summary (keeping the newest turns within half the budget)
+def _append_turn(session: dict, query: str, answer: str):
+    turns = session["turns"] + [{"role": "user", "content": query}, {"role": "assistant", "content": answer}]
+    if count_tokens(session["summary"]) + _history_tokens(turns) <= CHAT_HISTORY_TOKEN_BUDGET:
+        return turns, None
+    keep = len(turns)
+    while keep > 0 and _history_tokens(turns[keep - 1:]) <= CHAT_HISTORY_TOKEN_BUDGET // 2:
+        keep -= 1
+    return turns[keep:], turns[:keep]
+
+def _compaction_prompt(summary: str, old_turns: list) -> str:
+    conversation = "\n".join(f"{turn['role']}: {turn['content']}" for turn in old_turns)
+    return f"""
+        Update the running summary of a study conversation between a user and an assistant.
+        Keep the facts, definitions and conclusions the user may refer back to, drop small talk.
+        Keep it under {CHAT_HISTORY_TOKEN_BUDGET // 8} words.
+        
+        Current summary:
+        \"\"\"{summary}\"\"\"
+        
+        New turns to add:
+        \"\"\"{conversation}\"\"\"
+        """
+
+def _record_turn(session_id: str, session: dict, query: str, answer: str):
+    turns, old_turns = _append_turn(session, query, answer)
+    summary = session["summary"]
+    if old_turns:
+        summary = get_model().invoke(_compaction_prompt(summary, old_turns)).content
+    get_chat_sessions().save(session_id, summary, turns)
+
+async def _arecord_turn(session_id: str, session: dict, query: str, answer: str):
+    turns, old_turns = _append_turn(session, query, answer)
+    summary = session["summary"]
+    if old_turns:
+        summary = (await get_model().ainvoke(_compaction_prompt(summary, old_turns))).content
+    get_chat_sessions().save(session_id, summary, turns)
+
+# Chat history and summary to use for a request: the session's when a session id is given, else the client's
+def _resolve_history(chat_history: list, session_id: str = None):
+    if session_id is None:
+        return None, chat_history, ""
+    session = get_chat_session(session_id)
+    return session, session["turns"], session["summary"]
+
+# Answer questions based on notes and returns relevant chunks
+# With a `session_id` the history is read from (and the new turn saved to) the server-side session
+# `sources` limits retrieval to those files
+def answer_question_based_on_notes(query: str, chat_history: list, session_id: str = None, sources: list[str] = None,
+                                   notebook: str = DEFAULT_NOTEBOOK) -> dict:
+    session, chat_history, history_summary = _resolve_history(chat_history, session_id)
+    query_vector, relevant_docs = _retrieve(query, sources, notebook)
+    chunk_ids = [doc.id for doc in relevant_docs]
+    use_cache = _use_answer_cache(chat_history, history_summary)
+    answer = _lookup_answer(query_vector, chunk_ids) if use_cache else None
+    if answer is None:
+        messages = _build_messages(query, chat_history, relevant_docs, history_summary)
+        
+        # Query LLM w/ chat history 
+        response = get_model().invoke(messages)
+        answer = response.content
+        
+        if LOG_CONTENT:
+            logger.debug("generated response text=%r", answer)
+        if use_cache:
+            answer_cache.store(query_vector, chunk_ids, answer)
+    if session is not None:
+        _record_turn(session_id, session, query, answer)
     
     # Return Response content as well as relevant to API 
     return {
-        "answer" : response.content,
+        "answer" : answer,
     }
 
+# Async version of answer_question_based_on_notes, doesn't block the event loop while waiting on retrieval or the LLM
+async def aanswer_question_based_on_notes(query: str, chat_history: list, session_id: str = None, sources: list[str] = None,
+                                          notebook: str = DEFAULT_NOTEBOOK) -> dict:
+    session, chat_history, history_summary = _resolve_history(chat_history, session_id)
+    query_vector, relevant_docs = await _aretrieve(query, sources, notebook)
+    chunk_ids = [doc.id for doc in relevant_docs]
+    use_cache = _use_answer_cache(chat_history, history_summary)
+    answer = _lookup_answer(query_vector, chunk_ids) if use_cache else None
+    if answer is None:
+        messages = _build_messages(query, chat_history, relevant_docs, history_summary)
+        answer = (await get_model().ainvoke(messages)).content
+        if use_cache:
+            answer_cache.store(query_vector, chunk_ids, answer)
+    if session is not None:
+        await _arecord_turn(session_id, session, query, answer)
+    return {
+        "answer" : answer,
+    }
+
+# Same as aanswer_question_based_on_notes but yields the answer token by token as the LLM generates it
+async def astream_answer(query: str, chat_history: list, session_id: str = None, sources: list[str] = None,
+                         notebook: str = DEFAULT_NOTEBOOK):
+    session, chat_history, history_summary = _resolve_history(chat_history, session_id)
+    query_vector, relevant_docs = await _aretrieve(query, sources, notebook)
+    chunk_ids = [doc.id for doc in relevant_docs]
+    use_cache = _use_answer_cache(chat_history, history_summary)
+    answer = _lookup_answer(query_vector, chunk_ids) if use_cache else None
+    if answer is not None:
+        yield answer
+    else:
+        messages = _build_messages(query, chat_history, relevant_docs, history_summary)
+        tokens = []
+        async for chunk in get_model().astream(messages):
+            if chunk.content:
+                tokens.append(chunk.content)
+                yield chunk.content
+        answer = "".join(tokens)
+        if use_cache:
+            answer_cache.store(query_vector, chunk_ids, answer)
+    if session is not None:
+        await _arecord_turn(session_id, session, query, answer)
+
+# Runs map reduce over all chunks of a file and caches the result under `cache_key`
+def _generate_summary(file_name: str, cache_key: str = None, notebook: str = DEFAULT_NOTEBOOK) -> str:
+    logger.info("generating summary notebook=%s source=%s", notebook, file_name)
+    
+    # query the chunks of the live version, in document order
+    chunk_ids = get_catalog(notebook).chunk_ids(file_name)
+    if not chunk_ids:
+        raise ValueError(f"No documents found for {file_name}")
+    results = get_db(notebook).get(ids=chunk_ids, include=["documents"])
+    texts_by_id = dict(zip(results["ids"], results["documents"]))
+    
+    # Map reduce over the chunks (see summarizer.py)
+    summary = summarize_texts(
+        [texts_by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in texts_by_id],
+        model = get_model(),
+        map_cache = get_summary_map_cache(),
+        model_name = model_name_of(get_model()),
+        map_token_budget = SUMMARY_MAP_TOKEN_BUDGET,
+        reduce_token_budget = SUMMARY_REDUCE_TOKEN_BUDGET,
+        max_concurrency = SUMMARY_MAX_CONCURRENCY,
+        anchor_every = SUMMARY_MAP_ANCHOR_EVERY
+    )
+    logger.info("summarized source=%s map_batches=%d map_calls=%d collapse_rounds=%d",
+                file_name, summary['map_batches'], summary['map_calls'], summary['collapse_rounds'])
+    
+    # cache the summary
+    if cache_key:
+        get_summary_cache().set(cache_key, summary['summary'])
+    return summary['summary']
+
 # Generate Summary from all chunks that match input source
-def summarize_file(file_name:str):
+# Summaries and decks are cached by file name and content, so identical copies in two notebooks share them
+def summarize_file(file_name:str, notebook: str = DEFAULT_NOTEBOOK):
     # Multi Page Summaries
     # Use Map Reduce:
         # Generate Summary of smaller chunks
         # Generate and return summary of summaries
     try:
-        # check if summary exists in the cache 
-        now = datetime.now()
-        cached = summary_cache.get(file_name)
+        # check if summary of the current version of the file exists in the cache 
+        version = get_content_version(file_name, notebook)
+        cache_key = f"{file_name}:{version}"
+        with span("cache_lookup"):
+            cached = get_summary_cache().get(cache_key) if version else None
         
-        # check if summary is cached and recent
-        if cached and now-cached["timestamp"] < SUMMARY_TTL:
-            print("*** SUMMARY EXISTS IN CACHE ***")
+        if cached is not None:
+            logger.debug("summary cache hit source=%s", file_name)
             return {
-                "answer": cached["summary"]
+                "answer": cached
             }
         
         # Otherwise, generate and cache the summary
-        print("*** GENERATING SUMMARY ***")    
-        
-        # query all releveant documents based on source
-        results =  vector_db.get(where={"source": file_name})
-        # convert retrieved dict into Document Obj
-        source_documents = [
-            Document(page_content=text, metadata=meta)
-            for text, meta in zip(results["documents"], results["metadatas"])
-        ]
-        
-        # Define Map Prompt
-        map_prompt = """
-            You're reviewing notes. Extract valuable content in the following structure in a clear, study-friendly format:
-
-            💡 Big Ideas:
-            - Extract the most important insights or ideas.
-            
-            📘 Key Terms & Definitions:
-            - List any terms defined in this chunk. Format: **Term**: definition.
-
-            🔄 Summary:
-            - A one-sentence summary of this chunk.
-
-            Note:
-            \"\"\"{text}\"\"\"
-            """
-        # Create the prompt and pass input text
-        map_prompt_template = PromptTemplate(template=map_prompt, input_variables=["text"])
-        
-        # Define Prompt to combine summaries of each page/chunk
-        combine_prompt = """
-            You are summarizing extracted notes from multiple chunks. Organize your response with the following structure to promote study and learning for the user.:
-
-            ### 💡 **Big Ideas:**
-            - Merge big ideas across chunks into bullet points. Avoid repetition.
-            
-            ### 📘 **Key Terms & Definitions:**
-            - Combine and deduplicate key terms. Format: **Term**: definition.
-
-           ### 🔄 **Final Summary:**
-            - A 2–3 sentence high-level summary.
-
-            Chunks:
-            \"\"\"{text}\"\"\"
-            """
-        # Create Combine prompt and pass text
-        combine_prompt_template = PromptTemplate(template=combine_prompt, input_variables=["text"])
-
-        # Create a map reduce chain
-        """ Map Reduce:
-            - map reduce chain first applies an LLM chain to each document individually (map)
-            - treats the chain output as a new document
-            - then passes all the new documents to a seperate combine documents chain (reduce)
-            - finally a summary is generated based on these summaries of individual docs
-        """
-        # Define and invoke the chain
-        summary_chain = load_summarize_chain(
-            llm=model, 
-            chain_type = "map_reduce", 
-            map_prompt = map_prompt_template,
-            combine_prompt = combine_prompt_template
-            )
-        summary = summary_chain.invoke(source_documents)
-        print(summary['output_text'])
-        
-        # cache the summary, and return output
-        summary_cache[file_name] = {
-            "summary": summary['output_text'],
-            "timestamp": now
-        }
+        # concurrent requests for the same version (in any worker) share a single generation
+        summary = summary_flight.do(
+            cache_key,
+            lambda: _generate_summary(file_name, cache_key if version else None, notebook),
+            lookup = (lambda: get_summary_cache().get(cache_key)) if version else None
+        )
         return {
-            "answer": summary['output_text'],
+            "answer": summary,
         }
       
     except Exception as e:
-        print(f"Error: {e}")
+        logger.exception("summary failed notebook=%s source=%s", notebook, file_name)
 
 # Generate Flashcards (question and answer pairs) based on summaries
-def generate_flash_cards(file_name:str) -> list[dict]:
+# Decks are stored per file and summary, so they are only generated again once the document changes.
+# Concurrent requests for the same deck share a single generation
+def generate_flash_cards(file_name:str, notebook: str = DEFAULT_NOTEBOOK) -> list[dict]:
     
     # check if summary exisits in cache, generate otherwise 
-    summary = summarize_file(file_name)
+    summary = summarize_file(file_name, notebook)
+    if not summary:
+        raise ValueError(f"Could not summarize {file_name}")
+    deck_key = _deck_key(file_name, summary['answer'])
+    
+    with span("cache_lookup"):
+        deck = get_flashcard_cache().get(deck_key)
+    if deck is None:
+        deck = flashcard_flight.do(
+            deck_key,
+            lambda: _generate_flash_cards(summary['answer'], deck_key),
+            lookup = lambda: get_flashcard_cache().get(deck_key)
+        )
+    return {"flash_cards": deck}
+
+def _deck_key(file_name: str, summary: str) -> str:
+    return f"{file_name}:{hashlib.sha256(summary.encode('utf-8')).hexdigest()}"
+
+# Ask the model for a deck (constrained to the flashcard JSON schema) and keep every valid card
+def _generate_flash_cards(summary: str, deck_key: str) -> list[dict]:
     flashcard_prompt = f"""
-        Based on the following summary of a document, generate 15 flashcards in JSON format. Each flashcard should have a **concise question and answer** that helps the user study key ideas asnd definitions from the summary.
-        
-        Return a list of flashcards like this:
-        [
-            {{"question": "...", "answer": "..."}}
-            ...
-        ]
+        Based on the following summary of a document, generate {FLASHCARD_COUNT} flashcards. Each flashcard should have a **concise question and answer** that helps the user study key ideas asnd definitions from the summary.
         
         Summary:
-        \"\"\"{summary['answer']}\"\"\"
+        \"\"\"{summary}\"\"\"
         """
-    response = model.invoke(flashcard_prompt)
-    print(response.content)
-    
-    # Parse the JSON string into a list of dicts
-    content = response.content.strip()
-    # Strip code block if present (e.g., ```json ... ```)
-    if content.startswith("```"):
-        content = re.sub(r"^```(?:json)?\s*", "", content)
-        content = re.sub(r"\s*```$", "", content)
-
+    # Cards are parsed as the reply streams in, a malformed card or a broken stream only loses the cards it touches
+    parser = CardStreamParser()
+    complete = True
     try:
-        flashcards = json.loads(content)
+        for chunk in get_model().stream(flashcard_prompt, response_format=FLASHCARD_RESPONSE_FORMAT):
+            parser.feed(chunk.content)
     except Exception as e:
-        raise ValueError(f"Invalid JSON from model: {e}\n\nRaw content: {response.content}")
-
-    return {"flash_cards": flashcards}
-        
\ No newline at end of file
+        if not parser.cards:
+            raise
+        complete = False
+        logger.warning("flashcard generation stopped early cards=%d error=%s", len(parser.cards), e)
+    
+    if not parser.cards:
+        raise ValueError("The model did not return any valid flashcards")
+    
+    # A deck cut short by a broken stream is returned but not stored, the next request generates a full one
+    if complete:
+        get_flashcard_cache().set(deck_key, parser.cards)
+    return parser.cards
@@ -0,0 +1,161 @@
+import time, threading, bisect
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+from tokens import count_tokens
+
+## This File collects timings and token counts and renders them in the Prometheus text format ##
+# Stages: load, split, embed, upsert, retrieve, llm, cache_lookup. Served on GET /metrics
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+STAGE_SECONDS = Histogram("clarity_stage_seconds", "Time spent per pipeline stage", ("stage",))
+LLM_TOKENS = Counter("clarity_llm_tokens_total", "Tokens sent to / generated by the chat model", ("model", "kind"))
+LLM_CALLS = Counter("clarity_llm_calls_total", "Chat model calls", ("model", "status"))
+
+# Seconds spent in each stage by the current thread, so a caller can take a nested stage out of its own time
+_thread_totals = threading.local()
+
+def thread_stage_seconds(stage: str) -> float:
+    return getattr(_thread_totals, "seconds", {}).get(stage, 0.0)
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    totals = getattr(_thread_totals, "seconds", None)
+    if totals is None:
+        totals = _thread_totals.seconds = {}
+    totals[stage] = totals.get(stage, 0.0) + seconds
+
+# with span("embed"): ...
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+# Times every item pulled from a (lazy) iterator as `stage`
+def timed_iter(iterable, stage: str):
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            observe_stage(stage, time.perf_counter() - start)
+            return
+        observe_stage(stage, time.perf_counter() - start)
+        yield item
+
+# Callback attached to the chat model: times every call (invoke, stream, batch, async) and counts its tokens.
+# Uses the usage the API reports and falls back to counting with tiktoken when there is none
+class LLMMetricsCallback(BaseCallbackHandler):
+    run_inline = True   # keep async calls from hopping to a thread just for the bookkeeping
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._runs = {}   # run id -> (start time, prompt text)
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, prompt_text: str):
+        with self._lock:
+            self._runs[run_id] = (time.perf_counter(), prompt_text)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "\n".join(str(message.content) for batch in messages for message in batch))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "\n".join(prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            start, prompt_text = self._runs.pop(run_id, (None, ""))
+        if start is not None:
+            observe_stage("llm", time.perf_counter() - start)
+        LLM_CALLS.inc(model=self.model_name, status="ok")
+        usage = None
+        generations = [generation for batch in response.generations for generation in batch]
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        if usage:
+            prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        else:
+            prompt_tokens = count_tokens(prompt_text, self.model_name)
+            completion_tokens = sum(count_tokens(generation.text, self.model_name) for generation in generations)
+        LLM_TOKENS.inc(prompt_tokens, model=self.model_name, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=self.model_name, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            start, _ = self._runs.pop(run_id, (None, ""))
+        if start is not None:
+            observe_stage("llm", time.perf_counter() - start)
+        LLM_CALLS.inc(model=self.model_name, status="error")
+
+# Prometheus text exposition of every metric, plus gauges given as {name: (help, label names, {label values: value})}
+def render(extra_gauges: dict = None) -> str:
+    lines = []
+    for metric in (STAGE_SECONDS, LLM_CALLS, LLM_TOKENS):
+        lines.extend(metric.render())
+    for name, (documentation, labelnames, values) in (extra_gauges or {}).items():
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        for key, value in sorted(values.items()):
+            lines.append(f"{name}{_labels(labelnames, key)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,497 @@
+import os, json, uuid, sqlite3, logging, threading
+from contextlib import contextmanager
+from typing import Iterable, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+## This File is a vector store on memory-mapped NumPy arrays (CLARITY_VECTOR_BACKEND=numpy) ##
+# It has the interface main.py uses on Chroma (add_documents, get, delete, similarity_search_by_vector, as_retriever).
+# Vectors live in .npy files mapped into memory, so opening a large store reads almost nothing and every
+# worker on the machine shares the pages through the OS cache.
+# Vectors can be kept as float16 or int8 (what the search scans) next to float32 copies that only the
+# top candidates are read from, to re-score them exactly.
+# Search is brute force, or IVF once the store is large enough (k-means lists, only the closest lists are scanned).
+# Texts and metadata are kept in SQLite next to the arrays, which also serializes writers across processes
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+VECTOR_INDEXES = ("flat", "ivf")
+INITIAL_CAPACITY = 1024
+SCAN_BLOCK_ROWS = 8192        # rows scored at a time, small enough for the float32 copy of a block to stay in cache
+SQLITE_MAX_VARIABLES = 900
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50000         # vectors the IVF lists are trained on
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+# Spherical k-means: returns `lists` unit centroids for the unit vectors in `data`
+def _kmeans(data: np.ndarray, lists: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = data[rng.choice(len(data), lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, data)
+        counts = np.bincount(assignment, minlength=lists)
+        empty = counts == 0
+        # lists that lost all their vectors start again from a random vector
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+class NumpyVectorStore(VectorStore):
+    def __init__(self, directory: str, embedding_function: Embeddings, dtype: str = "float32", index: str = "flat",
+                 ivf_lists: int = 0, ivf_probes: int = 8, ivf_min_rows: int = 10000, rescore_factor: int = 4):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown vector dtype '{dtype}' (expected one of {', '.join(STORAGE_DTYPES)})")
+        if index not in VECTOR_INDEXES:
+            raise ValueError(f"Unknown vector index '{index}' (expected one of {', '.join(VECTOR_INDEXES)})")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._embedding = embedding_function
+        self.index = index
+        self.ivf_lists, self.ivf_probes, self.ivf_min_rows = ivf_lists, ivf_probes, ivf_min_rows
+        self.rescore_factor = rescore_factor
+        self._lock = threading.RLock()
+        # autocommit, writes open their own BEGIN IMMEDIATE transaction (the cross process write lock)
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), timeout=60,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                source TEXT,
+                list_id INTEGER,
+                document TEXT,
+                metadata TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_by_source ON chunks (source)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # the precision of an existing store wins over the configured one
+        stored_dtype = self._meta("dtype")
+        if stored_dtype is None:
+            self._set_meta("dtype", dtype)
+        elif stored_dtype != dtype:
+            logger.warning("vector store keeps its dtype path=%s dtype=%s configured=%s", directory, stored_dtype, dtype)
+        self.dtype = stored_dtype or dtype
+        # In memory state, reloaded whenever another process wrote (the generation in meta changed)
+        self._generation = None
+        self._ivf_generation = None
+        self.dim = 0
+        self._next_row = 0
+        self._vectors = self._scales = self._exact = None
+        self._row_sources = np.zeros(0, np.int32)   # source code of each row, -1 for free / deleted rows
+        self._row_lists = np.zeros(0, np.int32)     # IVF list of each row, -1 when not assigned
+        self._source_codes = {}
+        self._centroids = None
+        self._list_rows = None                      # rows grouped by IVF list, built on the first IVF search
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.npy")
+
+    @property
+    def _quantized(self) -> bool:
+        return self.dtype != "float32"
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _code(self, source) -> int:
+        return self._source_codes.setdefault(source, len(self._source_codes))
+
+    ## State ##
+
+    def _open_arrays(self):
+        self._vectors = self._scales = self._exact = None
+        if os.path.exists(self._path("vectors")):
+            self._vectors = np.load(self._path("vectors"), mmap_mode="r+")
+            if self.dtype == "int8":
+                self._scales = np.load(self._path("scales"), mmap_mode="r+")
+            if self._quantized:
+                self._exact = np.load(self._path("exact"), mmap_mode="r+")
+
+    @property
+    def _capacity(self) -> int:
+        return 0 if self._vectors is None else len(self._vectors)
+
+    # Reload the arrays and the row table if the store changed since we last looked
+    def _refresh(self):
+        generation = int(self._meta("generation") or 0)
+        if generation == self._generation:
+            return
+        self.dim = int(self._meta("dim") or 0)
+        self._next_row = int(self._meta("next_row") or 0)
+        self._open_arrays()
+        self._row_sources = np.full(self._capacity, -1, np.int32)
+        self._row_lists = np.full(self._capacity, -1, np.int32)
+        rows = self._conn.execute("SELECT row, source, list_id FROM chunks").fetchall()
+        if rows:
+            indexes = np.fromiter((row for row, _, _ in rows), np.int64, len(rows))
+            self._row_sources[indexes] = np.fromiter((self._code(source) for _, source, _ in rows), np.int32, len(rows))
+            self._row_lists[indexes] = np.fromiter((-1 if list_id is None else list_id for _, _, list_id in rows), np.int32, len(rows))
+        ivf_generation = int(self._meta("ivf_generation") or 0)
+        if ivf_generation != self._ivf_generation:
+            self._centroids = np.load(self._path("centroids")) if ivf_generation else None
+            self._ivf_generation = ivf_generation
+        self._list_rows = None
+        self._generation = generation
+
+    # Write transaction: other processes wait for it, the in memory state is brought up to date first
+    @contextmanager
+    def _write(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                yield
+                for array in (self._vectors, self._scales, self._exact):
+                    if array is not None:
+                        array.flush()
+                self._set_meta("next_row", self._next_row)
+                self._set_meta("generation", self._generation + 1)
+                self._conn.execute("COMMIT")
+                self._generation += 1
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                self._generation = None   # reload everything next time
+                raise
+
+    # Read transaction: the row table, the arrays and everything read from them belong to one generation.
+    # Rows are only meaningful within it, a compaction (here or in another process) renumbers them.
+    # The lock also keeps this thread from seeing another thread's uncommitted writes on the shared connection
+    @contextmanager
+    def _read(self):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if int(self._meta("generation") or 0) != self._generation:
+                    # reload behind the write lock, so no writer is halfway through replacing the arrays
+                    self._conn.execute("COMMIT")
+                    self._conn.execute("BEGIN IMMEDIATE")
+                    self._refresh()
+                yield
+            finally:
+                if self._conn.in_transaction:
+                    self._conn.execute("COMMIT")
+
+    # Files of `capacity` rows, keeping the first `keep` rows (in the order of `rows` when given)
+    def _resize(self, capacity: int, keep: int, rows: np.ndarray = None):
+        files = [("vectors", STORAGE_DTYPES[self.dtype], (capacity, self.dim), self._vectors)]
+        if self.dtype == "int8":
+            files.append(("scales", np.float32, (capacity,), self._scales))
+        if self._quantized:
+            files.append(("exact", np.float32, (capacity, self.dim), self._exact))
+        for name, dtype, shape, old in files:
+            temp_path = self._path(f"{name}.tmp")
+            new = np.lib.format.open_memmap(temp_path, mode="w+", dtype=dtype, shape=shape)
+            for start in range(0, keep, SCAN_BLOCK_ROWS):
+                stop = min(keep, start + SCAN_BLOCK_ROWS)
+                new[start:stop] = old[start:stop] if rows is None else old[rows[start:stop]]
+            new.flush()
+            del new
+            os.replace(temp_path, self._path(name))
+        self._open_arrays()
+
+    def _grow(self, needed: int):
+        capacity = max(INITIAL_CAPACITY, self._capacity)
+        while capacity < needed:
+            capacity *= 2
+        self._resize(capacity, self._next_row)
+        extra = capacity - len(self._row_sources)
+        self._row_sources = np.concatenate([self._row_sources, np.full(extra, -1, np.int32)])
+        self._row_lists = np.concatenate([self._row_lists, np.full(extra, -1, np.int32)])
+
+    # Rewrite the arrays without the deleted rows (rows are append only, deletes leave holes)
+    def _compact(self):
+        live = np.flatnonzero(self._row_sources[:self._next_row] >= 0)
+        capacity = INITIAL_CAPACITY
+        while capacity < len(live):
+            capacity *= 2
+        self._resize(capacity, len(live), live)
+        # ascending, so the row a chunk moves to is always free already
+        self._conn.executemany("UPDATE chunks SET row = ? WHERE row = ?",
+                               [(new, int(old)) for new, old in enumerate(live) if new != old])
+        sources, lists = self._row_sources[live], self._row_lists[live]
+        self._row_sources = np.full(capacity, -1, np.int32)
+        self._row_lists = np.full(capacity, -1, np.int32)
+        self._row_sources[:len(live)], self._row_lists[:len(live)] = sources, lists
+        self._next_row = len(live)
+        self._list_rows = None
+        logger.info("vector store compacted path=%s rows=%d", self.directory, len(live))
+
+    ## Writes ##
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[list[dict]] = None,
+                  ids: Optional[list[str]] = None, **kwargs) -> list[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = _normalize(np.asarray(self._embedding.embed_documents(texts), dtype=np.float32))
+        with self._write():
+            if not self.dim:
+                self.dim = vectors.shape[1]
+                self._set_meta("dim", self.dim)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {self.dim}")
+            # an id that is already stored is replaced (upsert, like Chroma)
+            self._delete_rows(self._rows_of(ids))
+            start = self._next_row
+            if start + len(texts) > self._capacity:
+                self._grow(start + len(texts))
+            self._store_vectors(start, vectors)
+            lists = self._assign(vectors) if self._centroids is not None else np.full(len(texts), -1, np.int32)
+            self._conn.executemany(
+                "INSERT INTO chunks (row, chunk_id, source, list_id, document, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                [(start + i, chunk_id, (metadata or {}).get("source"), None if lists[i] < 0 else int(lists[i]),
+                  text, json.dumps(metadata or {}))
+                 for i, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))],
+            )
+            self._row_sources[start:start + len(texts)] = [self._code((metadata or {}).get("source")) for metadata in metadatas]
+            self._row_lists[start:start + len(texts)] = lists
+            self._next_row = start + len(texts)
+            self._list_rows = None
+        self._maybe_train()
+        return ids
+
+    def _store_vectors(self, start: int, vectors: np.ndarray):
+        stop = start + len(vectors)
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            self._vectors[start:stop] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[start:stop] = scales
+        else:
+            self._vectors[start:stop] = vectors.astype(STORAGE_DTYPES[self.dtype])
+        if self._quantized:
+            self._exact[start:stop] = vectors
+
+    def delete(self, ids: Optional[list[str]] = None, where: Optional[dict] = None, **kwargs) -> Optional[bool]:
+        with self._write():
+            rows = self._rows_of(ids) if ids is not None else self._rows_where(where)
+            self._delete_rows(rows)
+            live = int((self._row_sources[:self._next_row] >= 0).sum())
+            if self._next_row - live > max(INITIAL_CAPACITY, live):
+                self._compact()
+        return True
+
+    def _delete_rows(self, rows: list[int]):
+        for i in range(0, len(rows), SQLITE_MAX_VARIABLES):
+            part = rows[i:i + SQLITE_MAX_VARIABLES]
+            self._conn.execute(f"DELETE FROM chunks WHERE row IN ({','.join('?' * len(part))})", part)
+        if rows:
+            self._row_sources[rows] = -1
+            self._row_lists[rows] = -1
+            self._list_rows = None
+
+    def _rows_of(self, ids: list[str]) -> list[int]:
+        rows = []
+        for i in range(0, len(ids), SQLITE_MAX_VARIABLES):
+            part = list(ids[i:i + SQLITE_MAX_VARIABLES])
+            rows.extend(row for (row,) in self._conn.execute(
+                f"SELECT row FROM chunks WHERE chunk_id IN ({','.join('?' * len(part))})", part))
+        return rows
+
+    def _rows_where(self, where: Optional[dict]) -> list[int]:
+        clause, params = self._where_clause(where)
+        return [row for (row,) in self._conn.execute(f"SELECT row FROM chunks{clause}", params)]
+
+    # The filters main.py uses: {"source": name}, {"source": {"$eq": name}} and {"source": {"$in": [names]}}
+    @staticmethod
+    def _where_clause(where: Optional[dict]) -> tuple[str, list]:
+        if not where:
+            return "", []
+        if set(where) != {"source"}:
+            raise ValueError(f"Unsupported filter: {where}")
+        condition = where["source"]
+        if isinstance(condition, dict):
+            if "$in" in condition:
+                names = list(condition["$in"])
+                return f" WHERE source IN ({','.join('?' * len(names))})", names
+            if "$eq" in condition:
+                return " WHERE source = ?", [condition["$eq"]]
+            raise ValueError(f"Unsupported filter: {where}")
+        return " WHERE source = ?", [condition]
+
+    ## IVF ##
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    # (Re)train the IVF lists once the store has grown to twice the size they were trained on
+    def _maybe_train(self):
+        def due(live: int) -> bool:
+            return live >= self.ivf_min_rows and live >= 2 * int(self._meta("trained_rows") or 0)
+        with self._lock:
+            if self.index != "ivf" or not due(int((self._row_sources[:self._next_row] >= 0).sum())):
+                return
+        with self._write():
+            live = np.flatnonzero(self._row_sources[:self._next_row] >= 0)
+            if not due(len(live)):   # another process trained them meanwhile
+                return
+            rng = np.random.default_rng(0)
+            lists = self.ivf_lists or int(np.clip(np.sqrt(len(live)), 16, 4096))
+            sample = np.sort(rng.choice(live, min(KMEANS_SAMPLE, len(live)), replace=False))
+            centroids = _kmeans(self._exact_vectors(sample), lists, rng)
+            self._centroids = centroids
+            assignment = np.empty(len(live), np.int32)
+            for start in range(0, len(live), SCAN_BLOCK_ROWS):
+                rows = live[start:start + SCAN_BLOCK_ROWS]
+                assignment[start:start + len(rows)] = self._assign(self._exact_vectors(rows))
+            self._conn.executemany("UPDATE chunks SET list_id = ? WHERE row = ?",
+                                   zip(assignment.tolist(), live.tolist()))
+            self._row_lists[live] = assignment
+            np.save(self._path("centroids.tmp"), centroids)
+            os.replace(self._path("centroids.tmp"), self._path("centroids"))
+            self._ivf_generation = int(self._meta("ivf_generation") or 0) + 1
+            self._set_meta("ivf_generation", self._ivf_generation)
+            self._set_meta("trained_rows", len(live))
+            self._list_rows = None
+            logger.info("ivf lists trained path=%s rows=%d lists=%d", self.directory, len(live), lists)
+
+    # Rows of each IVF list: rows sorted by list and where each list starts (list -1 = not assigned yet)
+    def _lists(self):
+        if self._list_rows is None:
+            row_lists = self._row_lists[:self._next_row]
+            order = np.argsort(row_lists, kind="stable")
+            bounds = np.searchsorted(row_lists[order], np.arange(-1, len(self._centroids) + 1))
+            self._list_rows = (order, bounds)
+        return self._list_rows
+
+    ## Reads ##
+
+    def _exact_vectors(self, rows) -> np.ndarray:
+        if self._quantized:
+            return np.asarray(self._exact[rows], dtype=np.float32)
+        return np.asarray(self._vectors[rows], dtype=np.float32)
+
+    # Approximate scores (what the scan uses) of the given rows / slice
+    def _scan_scores(self, rows, query: np.ndarray) -> np.ndarray:
+        scores = self._vectors[rows].astype(np.float32, copy=False) @ query
+        if self.dtype == "int8":
+            scores *= self._scales[rows]
+        return scores
+
+    # Rows of the best `k` chunks and their cosine similarity (call within _read)
+    def _search(self, query: np.ndarray, k: int, where: Optional[dict] = None) -> list[tuple[int, float]]:
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        n = self._next_row
+        if n == 0 or k <= 0:
+            return []
+        allowed = self._row_sources[:n] >= 0
+        if where:
+            clause, names = self._where_clause(where)
+            codes = [self._source_codes[name] for name in names if name in self._source_codes]
+            allowed &= np.isin(self._row_sources[:n], codes)
+        take = k * self.rescore_factor if self._quantized else k
+        if self.index == "ivf" and self._centroids is not None:
+            order, bounds = self._lists()
+            probes = np.argsort(-(self._centroids @ query))[:self.ivf_probes]
+            rows = np.concatenate([order[bounds[0]:bounds[1]]] + [order[bounds[p + 1]:bounds[p + 2]] for p in probes])
+            rows = np.sort(rows[allowed[rows]])
+            scores = np.concatenate([self._scan_scores(rows[i:i + SCAN_BLOCK_ROWS], query)
+                                     for i in range(0, len(rows), SCAN_BLOCK_ROWS)] or [np.zeros(0, np.float32)])
+        else:
+            rows = np.arange(n)
+            scores = np.concatenate([self._scan_scores(slice(i, min(n, i + SCAN_BLOCK_ROWS)), query)
+                                     for i in range(0, n, SCAN_BLOCK_ROWS)])
+            scores[~allowed] = -np.inf
+        if len(scores) == 0:
+            return []
+        take = min(take, len(scores))
+        best = np.argpartition(-scores, take - 1)[:take]
+        best = best[np.isfinite(scores[best])]
+        rows = rows[best]
+        if self._quantized:
+            # exact re-scoring of the candidates from the float32 copies
+            rows = np.sort(rows)
+            scores = self._exact_vectors(rows) @ query
+        else:
+            scores = scores[best]
+        top = np.argsort(-scores)[:k]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def _documents(self, rows: list[int]) -> dict[int, Document]:
+        documents = {}
+        for i in range(0, len(rows), SQLITE_MAX_VARIABLES):
+            part = rows[i:i + SQLITE_MAX_VARIABLES]
+            for row, chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT row, chunk_id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(part))})", part):
+                documents[row] = Document(id=chunk_id, page_content=text, metadata=json.loads(metadata or "{}"))
+        return documents
+
+    def similarity_search_by_vector_with_score(self, embedding: list[float], k: int = 4,
+                                               filter: Optional[dict] = None, **kwargs) -> list[tuple[Document, float]]:
+        with self._read():
+            results = self._search(embedding, k, filter)
+            documents = self._documents([row for row, _ in results])
+        return [(documents[row], score) for row, score in results if row in documents]
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, filter: Optional[dict] = None,
+                                    **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     **kwargs) -> list[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    # scores are cosine similarities, relevance maps them to [0, 1]
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    # Chroma style get: {"ids", "documents", "metadatas", "embeddings"}, in insertion order
+    def get(self, ids: Optional[list[str]] = None, where: Optional[dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Iterable[str] = ("documents", "metadatas")) -> dict:
+        include = set(include)
+        with self._read():
+            if ids is not None:
+                ids = list(ids)
+                rows = []
+                for i in range(0, len(ids), SQLITE_MAX_VARIABLES):
+                    part = ids[i:i + SQLITE_MAX_VARIABLES]
+                    rows.extend(self._conn.execute(
+                        f"SELECT row, chunk_id, document, metadata FROM chunks WHERE chunk_id IN ({','.join('?' * len(part))}) ORDER BY row",
+                        part).fetchall())
+            else:
+                clause, params = self._where_clause(where)
+                page = ""
+                if limit is not None or offset:
+                    page, params = " LIMIT ? OFFSET ?", params + [-1 if limit is None else limit, offset or 0]
+                rows = self._conn.execute(f"SELECT row, chunk_id, document, metadata FROM chunks{clause} ORDER BY row{page}", params).fetchall()
+            embeddings = None
+            if "embeddings" in include:
+                embeddings = list(self._exact_vectors(np.array([row[0] for row in rows], dtype=np.int64))) if rows else []
+        return {
+            "ids": [row[1] for row in rows],
+            "documents": [row[2] for row in rows] if "documents" in include else None,
+            "metadatas": [json.loads(row[3] or "{}") for row in rows] if "metadatas" in include else None,
+            "embeddings": embeddings,
+        }
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: Optional[list[dict]] = None,
+                   ids: Optional[list[str]] = None, directory: str = None, **kwargs) -> "NumpyVectorStore":
+        store = cls(directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
@@ -1,27 +1,67 @@
 import streamlit as st
 import requests
+import json
+import client
 # st.set_page_config(page_title="Clarity", page_icon=":brain:",layout="centered")
 st.title("💬 Chat with Your Notes")
 
-# Initialize chat history in session
+# Start a server-side session, the backend keeps (and compacts) the history
+def new_session():
+    try:
+        res = client.post("sessions")
+        res.raise_for_status()
+        return res.json()["session_id"]
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error: {e}")
+        return None
+
+# Initialize chat history (only used for display) and session
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if not st.session_state.get("chat_session"):
+    st.session_state.chat_session = new_session()
+
+# Start over with an empty conversation
+if st.button("New chat"):
+    if st.session_state.chat_session:
+        try:
+            client.delete(f"sessions/{st.session_state.chat_session}")
+        except requests.exceptions.RequestException:
+            pass   # the session expires on its own
+    st.session_state.chat_history = []
+    st.session_state.chat_session = new_session()
     
-# Send chat + history to backend
-def send_query(query):
-    API_URL = "http://localhost:8000/chat"  
-    # Format chat history for the backend 
+# Send query + session id to backend and yield the answer tokens as they stream back
+def stream_query(query):
     payload = {
         "query" : query,
-        "chat_history" : st.session_state.chat_history
+        "session_id" : st.session_state.chat_session
     }
     try:
-        res = requests.post(API_URL, json=payload)
-        res.raise_for_status()
-        return res.json()
+        with client.post("chat/stream", json=payload, stream=True) as res:
+            res.raise_for_status()
+            # Server-Sent Events: "event: <name>" and "data: <json>" lines, blank line between events
+            event = "message"
+            for line in res.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "error":
+                        st.error(f"Error: {data['detail']}")
+                        return
+                    if event == "done":
+                        return
+                    yield data["token"]
+                elif not line:
+                    event = "message"
     except requests.exceptions.RequestException as e:
         st.error(f"Error: {e}")
-        return None 
+
+# Display full chat history
+for turn in st.session_state.chat_history:
+    with st.chat_message(turn["role"]):
+        st.markdown(turn["content"])
 
 # Input box for user query
 # Correct usage
@@ -31,18 +71,13 @@ user_query = st.chat_input("Your Question:")
 if user_query:
     # Add user message to session state
     st.session_state.chat_history.append({"role":"user", "content":user_query})
+    with st.chat_message("user"):
+        st.markdown(user_query)
     
-    # Send to backend
-    result = send_query(user_query)
+    # Send to backend and render tokens as they arrive
+    with st.chat_message("assistant"):
+        assistant_reply = st.write_stream(stream_query(user_query))
     
-    if result:
+    if assistant_reply:
         # Add assistant response to history
-        assistant_reply = result["answer"]
         st.session_state.chat_history.append({"role":"assistant", "content":assistant_reply})
-
-# Display full chat history
-for turn in st.session_state.chat_history:
-    with st.chat_message(turn["role"]):
-        st.markdown(turn["content"])
-
-        
\ No newline at end of file
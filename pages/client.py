@@ -0,0 +1,65 @@
+import os
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+## This File is the pages' client for the Clarity API ##
+# Every page and rerun shares one pooled session (keep-alive connections, timeouts, retries).
+# The document list is cached for a short while, so clicking around doesn't list the documents
+# again every time, and it is dropped as soon as an upload or delete changes it
+
+API_URL = os.getenv("CLARITY_API_URL", "http://localhost:8000").rstrip("/") + "/"
+NOTEBOOK = os.getenv("CLARITY_NOTEBOOK") or None   # sent as X-Notebook, the API's default notebook when unset
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = float(os.getenv("CLARITY_API_TIMEOUT", "300"))   # summaries of long documents take a while
+DOCUMENTS_TTL = float(os.getenv("CLARITY_DOCUMENTS_TTL", "60"))   # seconds
+
+# Failed connections are retried for every request (nothing was sent yet), read errors and 502-504
+# responses only for idempotent methods (GET, DELETE, ...), uploads are never sent twice
+@st.cache_resource
+def get_session() -> requests.Session:
+    retry = Retry(total=3, connect=3, read=1, status=2, backoff_factor=0.3, status_forcelist=(502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if NOTEBOOK:
+        session.headers["X-Notebook"] = NOTEBOOK
+    return session
+
+def request(method: str, path: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    return get_session().request(method, API_URL + path, **kwargs)
+
+def get(path: str, **kwargs) -> requests.Response:
+    return request("GET", path, **kwargs)
+
+def post(path: str, **kwargs) -> requests.Response:
+    return request("POST", path, **kwargs)
+
+def delete(path: str, **kwargs) -> requests.Response:
+    return request("DELETE", path, **kwargs)
+
+# Names of the uploaded documents (errors are not cached, the next rerun asks again)
+@st.cache_data(ttl=DOCUMENTS_TTL, show_spinner=False)
+def _documents(api_url: str, notebook: str) -> list[str]:
+    names = []
+    while True:
+        res = get("documents", params={"offset": len(names), "limit": 1000})
+        res.raise_for_status()
+        data = res.json()
+        names.extend(data.get("file_names", []))
+        if not data.get("file_names") or len(names) >= data.get("total", 0):
+            return names
+
+def query_docs() -> list[str]:
+    try:
+        return _documents(API_URL, NOTEBOOK)
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error: {e}")
+        return []
+
+# Call after anything that adds or removes documents
+def invalidate_docs():
+    _documents.clear()
@@ -1,11 +1,9 @@
 import streamlit as st
-import requests
+import client
 # from wide import wide_page
 # wide_page()
 # st.set_page_config(page_title="Clarity", page_icon=":brain:",layout="wide")
 
-API_URL = "http://localhost:8000/flashcards"
-
 st.title("📚 AI-Generated Flashcards")
 
 st.markdown("""
@@ -24,20 +22,9 @@ st.markdown("""
 }
 </style>
 """, unsafe_allow_html=True)
-API_URL = "http://localhost:8000/"
-def query_docs():
-    try:
-        res = requests.get(API_URL+"documents")
-        res.raise_for_status()
-        data = res.json() 
-        return data.get("file_names",[])
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error: {e}")
-        return []
-    
 def get_flashcards(file_name):
     try:    
-        response = requests.post(API_URL+"flashcards", json={"file_name": file_name})
+        response = client.post("flashcards", json={"file_name": file_name})
 
         response.raise_for_status()
         flashcards = response.json()["flash_cards"]
@@ -55,7 +42,7 @@ if "flashcards" not in st.session_state:
 if "flips" not in st.session_state:
     st.session_state["flips"] = {}
     
-docs = query_docs()
+docs = client.query_docs()
 summary = ''
 if docs:
     st.subheader("Select a document to generate Flashcards:")
@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import client
 
 # st.set_page_config(page_title="Clarity", page_icon=":brain:",layout="centered")
 st.title("Remove Documents")
@@ -16,30 +17,20 @@ st.markdown("""
 }
 </style>
 """, unsafe_allow_html=True)
-API_URL = "http://localhost:8000/"
-def query_docs():
-    try:
-        res = requests.get(API_URL + "documents")
-        res.raise_for_status()
-        data = res.json() # parse json response
-        return data.get("file_names",[])
-
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error: {e}")
-        return [] 
 def delete_doc(doc_name):
     try:
         payload = {
             "file_name": doc_name
         }
-        res = requests.post(API_URL+"delete",json=payload)
+        res = client.post("delete",json=payload)
         res.raise_for_status()
+        client.invalidate_docs()
         return res.json()
     except requests.exceptions.RequestException as e:
         st.error(f"Error: {e}")
         return False 
 
-docs = query_docs()
+docs = client.query_docs()
 if docs:
     st.subheader("🗑️ Click a document to delete it")
 
@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import client
 # st.set_page_config(page_title="Clarity", page_icon=":brain:",layout="centered")
 
 st.title("📝 Summarize")
@@ -18,23 +19,12 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-API_URL = "http://localhost:8000/"
-def query_docs():
-    try:
-        res = requests.get(API_URL +"documents")
-        res.raise_for_status()
-        data = res.json() # parse json response
-        return data.get("file_names", [])
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error: {e}")
-        return []
-
 def summarize_doc(doc_name):
     try:
         payload = {
             "file_name": doc_name
         }
-        res = requests.post(API_URL + "summarize", json=payload)
+        res = client.post("summarize", json=payload)
         res.raise_for_status()
         data = res.json()
         return data.get("answer", "No summary for selected file")
@@ -42,7 +32,7 @@ def summarize_doc(doc_name):
             st.error(f"Error: {e}")
             return("")
 
-docs = query_docs()
+docs = client.query_docs()
 summary = ''
 if docs:
     st.subheader("Select a document to summarize:")
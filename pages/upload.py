@@ -1,33 +1,103 @@
 import streamlit as st
 import requests
+import client
 import mimetypes
+import hashlib
+import time
 
 st.title("📤 Upload")
 st.markdown("Upload your notes for summaries, Q&A, and flashcard generation.")
 # File Upload
 uploaded_file = st.file_uploader("", type=["txt","pdf"])
+
+# Uploads this session already sent: (file name, sha256 of the bytes) -> job id
+# Every widget interaction reruns this script, a file that was already sent is followed, not sent again
+if "uploads" not in st.session_state:
+    st.session_state["uploads"] = {}
+
+# Status of the job of an upload sent earlier, None if it was never sent (or the backend forgot the job)
+def submitted_job(upload_key):
+    job_id = st.session_state["uploads"].get(upload_key)
+    if job_id:
+        try:
+            res = client.get(f"jobs/{job_id}")
+            if res.status_code == 200:
+                return res.json()
+        except requests.exceptions.RequestException:
+            pass
+    return None
+
 if uploaded_file:
-    mime_type, _ = mimetypes.guess_type(uploaded_file.name) # Dyamically determine media type
-    if not mime_type:
-        mime_type = "application/octet-stream"  # Fallback
-    files = {"file": (uploaded_file.name, uploaded_file,mime_type)}
+    upload_key = (uploaded_file.name, hashlib.sha256(uploaded_file.getvalue()).hexdigest())
+    job = submitted_job(upload_key)
+    if job is None:
+        mime_type, _ = mimetypes.guess_type(uploaded_file.name) # Dyamically determine media type
+        if not mime_type:
+            mime_type = "application/octet-stream"  # Fallback
+        files = {"file": (uploaded_file.name, uploaded_file.getvalue(), mime_type)}
+        
+        # Send file to FastAPI, it is queued for processing and we get a job back
+        # (the backend answers right away when it already has this exact file)
+        try:
+            response = client.post("upload", files=files)
+        except requests.exceptions.RequestException as e:
+            st.error(f"❌ Failed to upload the file: {e}")
+            st.stop()
+        if response.status_code not in (200, 202):
+            st.error(f"❌ Failed to process the file: {response.text}")
+            st.stop()
+        job = response.json()
+        st.session_state["uploads"][upload_key] = job["job_id"]
     
-    # Send file to FastAPI for processing
-    api_url = "http://localhost:8000/upload" 
-    response = requests.post(api_url, files=files)
+    if job["status"] in ("queued", "running"):
+        # Clicking cancel reruns the script, which follows the same job back here: cancel it
+        if st.button("Cancel upload", key="cancel_upload"):
+            try:
+                res = client.post(f"jobs/{job['job_id']}/cancel")
+                if res.status_code == 200:
+                    job = res.json()
+                else:
+                    st.warning(f"Could not cancel the upload: {res.text}")
+            except requests.exceptions.RequestException as e:
+                st.warning(f"Could not cancel the upload: {e}")
+        # Poll the job until the backend is done with it
+        progress = st.progress(0.0, text="Queued...")
+        while job["status"] in ("queued", "running"):
+            time.sleep(0.5)
+            job = submitted_job(upload_key)
+            if job is None:
+                # e.g. the backend restarted: forget the job, the file is sent again on the next rerun
+                progress.empty()
+                del st.session_state["uploads"][upload_key]
+                client.invalidate_docs()
+                st.error("❌ Lost track of the upload, the backend no longer knows its job. It is sent again the next time this page runs.")
+                st.stop()
+            text = f"{job['stage'].capitalize()}: {job['pages_parsed']} pages parsed, {job['chunks_embedded']} chunks embedded"
+            fraction = job["pages_parsed"] / job["pages_total"] if job["pages_total"] else 0.0
+            progress.progress(min(fraction, 1.0), text=text)
+        progress.empty()
+        client.invalidate_docs()
     
-    if response.status_code == 200:
-        st.success("✅ File processed successfully!")
-        # query = st.text_input("Ask questions based on your notes: ")
-        # if query:
-        #     with st.spinner("Thinking..."):
-        #         query_url = "http://localhost:8000/ask" 
-
-        #         response = requests.post(query_url, json={"query":query})
-        #         result = response.json()
-        #         st.write("**Answer:**", result['answer'])
-        #         with st.expander("Sources"):
-        #             for source in result["sources"]:
-        #                 st.write(source)
+    if job["status"] == "succeeded":
+        if job.get("unchanged"):
+            st.success("✅ This file was already processed, nothing changed.")
+        else:
+            st.success("✅ File processed successfully!")
+    elif job["status"] == "cancelled":
+        st.warning("Upload cancelled.")
     else:
-        st.error(f"❌ Failed to process the file: {response.text}")
\ No newline at end of file
+        st.error(f"❌ Failed to process the file: {job['error']}")
+    if job["status"] in ("failed", "cancelled") and st.button("Upload again"):
+        del st.session_state["uploads"][upload_key]
+        st.rerun()
+    # query = st.text_input("Ask questions based on your notes: ")
+    # if query:
+    #     with st.spinner("Thinking..."):
+    #         query_url = "http://localhost:8000/ask" 
+
+    #         response = requests.post(query_url, json={"query":query})
+    #         result = response.json()
+    #         st.write("**Answer:**", result['answer'])
+    #         with st.expander("Sources"):
+    #             for source in result["sources"]:
+    #                 st.write(source)
@@ -0,0 +1,111 @@
+import os, time, zipfile, tempfile
+from langchain_core.documents import Document
+from langchain_community.document_loaders import PyPDFLoader
+from pypdf import PdfReader
+from config import INGEST_TEXT_BLOCK_SIZE
+from chunking import ChunkingOptions, make_chunker
+
+## This File reads uploaded files and splits them into chunks ##
+# It only depends on the loaders and the chunker, so bulk uploads can run it in worker processes
+
+SUPPORTED_EXTENSIONS = ('.txt', '.pdf')
+
+# Name a file is stored under: its lower case name without the extension
+def source_name(file_name: str) -> str:
+    return os.path.splitext(os.path.basename(file_name))[0].lower()
+
+# Yields a .txt file in paragraph aligned blocks so the whole file is never held in memory
+def iter_text_blocks(file_path, block_size=INGEST_TEXT_BLOCK_SIZE):
+    with open(file_path, encoding="utf-8", errors="replace") as f:
+        block, size = [], 0
+        for line in f:
+            block.append(line)
+            size += len(line)
+            # flush on a blank line once the block is big enough, or force it if there are none
+            if (size >= block_size and not line.strip()) or size >= 4 * block_size:
+                yield Document(page_content="".join(block), metadata={"source": file_path})
+                block, size = [], 0
+        if block:
+            yield Document(page_content="".join(block), metadata={"source": file_path})
+
+# Lazily yields the pages (pdf) or blocks (txt) of a file
+def load_pages(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension =='.txt':
+        return iter_text_blocks(file_path)
+    elif extension =='.pdf':
+        return PyPDFLoader(file_path=file_path).lazy_load()
+    raise ValueError(f"Unsupported file type: {extension}")
+
+# 1 based page number of a loaded pdf page, None for text blocks
+def page_number(page: Document):
+    index = page.metadata.get("page")
+    return index + 1 if isinstance(index, int) else None
+
+def is_pdf(file_path):
+    return os.path.splitext(file_path)[1].lower() == '.pdf'
+
+# Number of pages in a pdf (only reads the page tree), None for text files
+def count_pages(file_path):
+    if is_pdf(file_path):
+        return len(PdfReader(file_path).pages)
+    return None
+
+# Parse and chunk a whole file (run in a worker process by bulk uploads)
+# Returns the chunks, the page count (pdf only) and the time spent loading / splitting
+def split_file(file_path, options: ChunkingOptions = None) -> dict:
+    chunker = make_chunker(options)
+    chunks, pages = [], 0
+    load_seconds = split_seconds = 0.0
+    page_iter = iter(load_pages(file_path))
+    while True:
+        start = time.perf_counter()
+        page = next(page_iter, None)
+        load_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        if page is None:
+            chunks.extend(chunker.finish())
+            split_seconds += time.perf_counter() - start
+            break
+        pages += 1
+        chunks.extend(chunker.feed(page.page_content, page_number(page)))
+        split_seconds += time.perf_counter() - start
+    return {
+        "chunks": chunks,
+        "page_count": pages if is_pdf(file_path) else None,
+        "load_seconds": load_seconds,
+        "split_seconds": split_seconds,
+    }
+
+# Extract the supported files of a zip archive into `directory`
+# Only base names are used (no paths from the archive end up on disk) and the archive is checked against
+# `max_files` / `max_bytes` (uncompressed) before anything is written.
+# Returns [(extracted path, name inside the archive)]
+def extract_archive(archive_path: str, directory: str, max_files: int, max_bytes: int) -> list[tuple[str, str]]:
+    with zipfile.ZipFile(archive_path) as archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and os.path.splitext(info.filename)[1].lower() in SUPPORTED_EXTENSIONS
+            and not os.path.basename(info.filename).startswith(".")
+            and "__MACOSX" not in info.filename
+        ]
+        if len(members) > max_files:
+            raise ValueError(f"Archive has {len(members)} files, at most {max_files} are allowed")
+        total = sum(info.file_size for info in members)
+        if total > max_bytes:
+            raise ValueError(f"Archive expands to {total} bytes, at most {max_bytes} are allowed")
+        extracted = []
+        for info in members:
+            handle, path = tempfile.mkstemp(suffix=os.path.splitext(info.filename)[1].lower(), dir=directory)
+            with archive.open(info) as source, os.fdopen(handle, "wb") as target:
+                # stop at the declared size, a forged header can't make us write more than was checked
+                remaining = info.file_size
+                while remaining > 0:
+                    block = source.read(min(1024 * 1024, remaining))
+                    if not block:
+                        break
+                    target.write(block)
+                    remaining -= len(block)
+            extracted.append((path, info.filename))
+        return extracted
@@ -0,0 +1,34 @@
+import numpy as np
+
+## This File combines ranked retrieval results ##
+
+# Reciprocal rank fusion: each ranking adds 1 / (k + rank) to the score of every id it contains
+# Only ranks are used, so BM25 and cosine scores don't need to be on the same scale
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+# Maximal marginal relevance: greedily pick `k` candidates that are similar to the query
+# but not to the ones already picked. Returns indices into `candidate_vectors`
+def mmr_select(query_vector, candidate_vectors, k: int, lambda_mult: float = 0.5) -> list[int]:
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    if not len(candidates):
+        return []
+    query = np.asarray(query_vector, dtype=np.float32)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = query / max(np.linalg.norm(query), 1e-12)
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+    selected = [int(np.argmax(relevance))]
+    # highest similarity of every candidate to anything selected so far
+    redundancy = similarity[selected[0]].copy()
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
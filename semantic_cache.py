@@ -0,0 +1,88 @@
+import time, threading
+from collections import OrderedDict
+import numpy as np
+
+## This File caches chat answers by query meaning ##
+# A new query reuses a stored answer when its embedding is within `threshold` cosine similarity
+# of a cached query AND retrieval returned the exact same chunks, so the answer was built from the same notes.
+# Entries are per worker process, expire after `ttl` seconds and are evicted least recently used first
+
+class SemanticCache:
+    def __init__(self, threshold: float, ttl: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # id -> (query vector, chunk ids, answer, created_at), oldest first
+        self._next_id = 0
+        self._matrix = None             # stacked query vectors of all entries, rebuilt after changes
+        self._matrix_ids = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # Returns the cached answer for a similar query that used the same chunks, or None
+    def lookup(self, query_vector, chunk_ids: list[str]):
+        query = self._normalize(query_vector)
+        chunk_ids = tuple(sorted(chunk_ids))
+        now = time.time()
+        with self._lock:
+            self._drop_expired(now)
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_ids = list(self._entries)
+                    self._matrix = np.stack([self._entries[i][0] for i in self._matrix_ids])
+                # cosine similarity with every cached query at once, best matches first
+                scores = self._matrix @ query
+                for index in np.argsort(-scores):
+                    if scores[index] < self.threshold:
+                        break
+                    entry_id = self._matrix_ids[index]
+                    _, entry_chunks, answer, _ = self._entries[entry_id]
+                    if entry_chunks == chunk_ids:
+                        self._entries.move_to_end(entry_id)
+                        self.hits += 1
+                        return answer
+            self.misses += 1
+            return None
+
+    def store(self, query_vector, chunk_ids: list[str], answer: str):
+        with self._lock:
+            self._entries[self._next_id] = (self._normalize(query_vector), tuple(sorted(chunk_ids)), answer, time.time())
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    # Drop every answer that was built from any of the given chunks (they were deleted or re-written)
+    def invalidate_chunks(self, chunk_ids):
+        chunk_ids = set(chunk_ids)
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items() if chunk_ids.intersection(entry[1])]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            if stale:
+                self._matrix = None
+
+    def _drop_expired(self, now: float):
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry[3] >= self.ttl]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._matrix = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
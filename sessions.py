@@ -0,0 +1,55 @@
+import os, json, time, uuid, sqlite3, threading
+from typing import Optional
+
+## This File stores chat sessions on the server so clients only send the new query ##
+# A session holds the most recent turns plus a running summary of the older ones
+
+class SessionStore:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                turns TEXT NOT NULL DEFAULT '[]',
+                updated_at REAL NOT NULL
+            )""")
+        self._conn.commit()
+
+    def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("INSERT INTO sessions (id, updated_at) VALUES (?, ?)", (session_id, time.time()))
+            self._conn.commit()
+        return session_id
+
+    # Returns {"summary": str, "turns": [{"role", "content"}, ...]} or None for an unknown session
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT summary, turns FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        return {"summary": row[0], "turns": json.loads(row[1])}
+
+    def save(self, session_id: str, summary: str, turns: list[dict]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE sessions SET summary = ?, turns = ?, updated_at = ? WHERE id = ?",
+                (summary, json.dumps(turns), time.time(), session_id),
+            )
+            self._conn.commit()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+            self._conn.commit()
+        return deleted > 0
+
+    # Remove sessions nobody has used for `max_age` seconds
+    def expire(self, max_age: float):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - max_age,))
+            self._conn.commit()
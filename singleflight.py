@@ -0,0 +1,76 @@
+import os, hashlib, threading
+from contextlib import contextmanager
+
+try:
+    import fcntl    # file locks, not available on Windows
+except ImportError:
+    fcntl = None
+
+## This File makes concurrent callers asking for the same expensive result share one computation ##
+
+# Holds an exclusive file lock for `key` in `lock_dir`, so only one worker process at a time gets past it
+@contextmanager
+def process_lock(lock_dir: str, key: str):
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(lock_dir, exist_ok=True)
+    path = os.path.join(lock_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".lock")
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# One in-flight computation that other callers wait on
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self, lock_dir: str):
+        self.lock_dir = lock_dir   # created by the first process lock
+        self.coalesced = 0  # callers that got another caller's result instead of computing it
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    # Only one worker process computes `key` at a time
+    def _process_lock(self, key: str):
+        return process_lock(self.lock_dir, key)
+
+    # Returns fn() but runs it at most once at a time per key.
+    # Threads of this process asking for the same key wait for the running call and share its result.
+    # Other processes wait on the file lock, then `lookup()` (e.g. a shared cache read) is tried
+    # before computing, so they can pick up the result the first process just stored
+    def do(self, key: str, fn, lookup=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            self.coalesced += 1
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            with self._process_lock(key):
+                result = lookup() if lookup else None
+                if result is None:
+                    result = fn()
+                else:
+                    self.coalesced += 1
+            call.result = result
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,128 @@
+import hashlib
+from langchain_core.prompts import PromptTemplate
+from tokens import count_tokens
+
+## This File holds the map reduce summarization engine ##
+""" Map Reduce:
+    - chunks are packed into batches of up to `map_token_budget` tokens
+    - each batch is summarized on its own (map), `max_concurrency` LLM calls at a time
+    - map outputs are cached by batch content, so re-summarizing an edited document
+      only re-maps the batches whose chunks changed
+    - if the map outputs don't fit in `reduce_token_budget` they are combined in groups
+      (collapse) until they do, then a final summary of summaries is generated (reduce)
+"""
+
+# Define Map Prompt
+map_prompt = """
+    You're reviewing notes. Extract valuable content in the following structure in a clear, study-friendly format:
+
+    💡 Big Ideas:
+    - Extract the most important insights or ideas.
+
+    📘 Key Terms & Definitions:
+    - List any terms defined in this chunk. Format: **Term**: definition.
+
+    🔄 Summary:
+    - A one-sentence summary of this chunk.
+
+    Note:
+    \"\"\"{text}\"\"\"
+    """
+# Create the prompt and pass input text
+map_prompt_template = PromptTemplate(template=map_prompt, input_variables=["text"])
+
+# Define Prompt to combine summaries of each page/chunk
+combine_prompt = """
+    You are summarizing extracted notes from multiple chunks. Organize your response with the following structure to promote study and learning for the user.:
+
+    ### 💡 **Big Ideas:**
+    - Merge big ideas across chunks into bullet points. Avoid repetition.
+
+    ### 📘 **Key Terms & Definitions:**
+    - Combine and deduplicate key terms. Format: **Term**: definition.
+
+   ### 🔄 **Final Summary:**
+    - A 2–3 sentence high-level summary.
+
+    Chunks:
+    \"\"\"{text}\"\"\"
+    """
+# Create Combine prompt and pass text
+combine_prompt_template = PromptTemplate(template=combine_prompt, input_variables=["text"])
+
+# Collapsing stops after this many rounds even if the summaries still don't fit
+MAX_COLLAPSE_ROUNDS = 5
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# Greedily pack chunks into batches of at most `token_budget` tokens (a chunk bigger than the budget gets its own batch)
+# A batch also ends after an "anchor" chunk (1 in `anchor_every`, chosen by content hash) so that after an edit
+# the batch boundaries line up again and every batch that doesn't contain the edit keeps its cached map output
+def pack_batches(texts: list[str], token_budget: int, anchor_every: int) -> list[str]:
+    batches, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > token_budget:
+            batches.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+        if int(_hash(text)[:8], 16) % anchor_every == 0:
+            batches.append("\n\n".join(current))
+            current, current_tokens = [], 0
+    if current:
+        batches.append("\n\n".join(current))
+    return batches
+
+# Split texts into consecutive groups of at most `token_budget` tokens
+def _group_by_tokens(texts: list[str], token_budget: int) -> list[list[str]]:
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > token_budget:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+# Run one prompt per text, at most `max_concurrency` LLM calls at a time
+def _run_prompts(model, template: PromptTemplate, texts: list[str], max_concurrency: int) -> list[str]:
+    prompts = [template.format(text=text) for text in texts]
+    responses = model.batch(prompts, config={"max_concurrency": max_concurrency})
+    return [response.content for response in responses]
+
+# Summarize the chunks of a document, returns the summary and how much LLM work it took
+def summarize_texts(texts: list[str], model, map_cache, model_name: str, map_token_budget: int,
+                    reduce_token_budget: int, max_concurrency: int, anchor_every: int) -> dict:
+    # Map: summarize each batch, reusing cached outputs for batches we've already seen
+    batches = pack_batches(texts, map_token_budget, anchor_every)
+    keys = [f"{model_name}:{_hash(map_prompt)[:12]}:{_hash(batch)}" for batch in batches]
+    cached = map_cache.get_many(keys)
+    todo = [(key, batch) for key, batch in zip(keys, batches) if key not in cached]
+    if todo:
+        outputs = _run_prompts(model, map_prompt_template, [batch for _, batch in todo], max_concurrency)
+        fresh = {key: output for (key, _), output in zip(todo, outputs)}
+        map_cache.set_many(fresh)
+        cached.update(fresh)
+    summaries = [cached[key] for key in keys]
+
+    # Collapse: combine groups of summaries until they all fit in one reduce prompt
+    rounds = 0
+    while (len(summaries) > 1 and rounds < MAX_COLLAPSE_ROUNDS
+           and count_tokens("\n\n".join(summaries)) > reduce_token_budget):
+        groups = _group_by_tokens(summaries, reduce_token_budget)
+        summaries = _run_prompts(model, combine_prompt_template, ["\n\n".join(group) for group in groups], max_concurrency)
+        rounds += 1
+
+    # Reduce: generate the summary of summaries
+    summary = model.invoke(combine_prompt_template.format(text="\n\n".join(summaries))).content
+    return {
+        "summary": summary,
+        "map_batches": len(batches),
+        "map_calls": len(todo),
+        "collapse_rounds": rounds,
+    }
@@ -0,0 +1,25 @@
+from functools import lru_cache
+
+## This File counts tokens the way the OpenAI models do ##
+
+@lru_cache(maxsize=None)
+def _get_encoding(model_name: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # the encoding files are downloaded on first use, fall back to the estimate when offline
+        return None
+
+# Number of tokens in `text` (about 4 characters per token when tiktoken isn't available)
+def count_tokens(text: str, model_name: str = "gpt-4o") -> int:
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,27 @@
+import os, argparse
+from urllib.parse import urlparse
+
+## This File runs the Chroma server that owns db/chroma_db ##
+# Start it once and point every API worker at it with CLARITY_CHROMA_URL, so no worker opens the
+# Chroma files itself and several workers can run side by side:
+#   python vector_server.py                   # listens on CLARITY_CHROMA_URL (http://127.0.0.1:8001)
+#   CLARITY_CHROMA_URL=http://127.0.0.1:8001 uvicorn api:app --workers 4
+
+def main():
+    from config import CHROMA_URL
+    from db import persistent_directory
+    url = urlparse(CHROMA_URL or "http://127.0.0.1:8001")
+    parser = argparse.ArgumentParser(description="Run the shared Chroma vector store server")
+    parser.add_argument("--host", default=url.hostname, help="address to listen on")
+    parser.add_argument("--port", type=int, default=url.port or 8001)
+    parser.add_argument("--path", default=persistent_directory, help="Chroma data directory")
+    args = parser.parse_args()
+
+    import uvicorn
+    # read by chromadb.app when it builds its client
+    os.environ.update({"IS_PERSISTENT": "True", "PERSIST_DIRECTORY": args.path})
+    # one process: it is the only writer of the files
+    uvicorn.run("chromadb.app:app", host=args.host, port=args.port, workers=1, timeout_keep_alive=30)
+
+if __name__ == "__main__":
+    main()